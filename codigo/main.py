@@ -1,37 +1,121 @@
-from flask import Flask
-from flask import render_template
-from flask import request
-
-import json
-import plotly.graph_objects as go
-
-app = Flask(__name__)
-
-@app.route('/')
-def hello_world():
-   return '<p>Hello, World!</p>'
-
-@app.route('/hello/')
-@app.route('/hello/<name>')
-def hello(name=None):
-   return render_template('hello.html', name=name, graphJSON = None)
-
-@app.route('/login')
-def login():
-   name = request.args.get('user')
-   return render_template('hello.html', name=name, graphJSON = None)
-
-@app.route('/plotly')
-def plotly():
-   fig = go.Figure(
-      data=[go.Bar(y=[2, 1, 3])],
-      layout_title_text="Figura"
-   )
-   #fig.show()
-   import plotly
-   a = plotly.utils.PlotlyJSONEncoder
-   graphJSON = json.dumps(fig, cls=a)
-   return render_template('hello.html', graphJSON=graphJSON)
-
-if __name__ == '__main__':
-   app.run(debug = True)
+from flask import Flask
+from flask import Response
+from flask import abort
+from flask import render_template
+from flask import request
+from flask import url_for
+
+import json
+import os
+import sys
+
+# the analysis modules live in src/, next to the database, the wordlist and the legal JSON file they read
+SRC_DIRECTORY = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+sys.path.insert(0, SRC_DIRECTORY)
+
+import analytics
+import create_database
+import cracking
+import db
+import figures
+from useful_functions import prepare_database
+
+# the paths are absolute, so the app works from any working directory
+db.set_database_path(os.path.join(SRC_DIRECTORY, 'database.db'))
+cracking.set_wordlist_path(os.path.join(SRC_DIRECTORY, 'rockyou.txt'))
+
+# the API only reads the database: migrate it when the app starts, and leave the classification of the passwords,
+# which needs the wordlist, to the ingest and the crack command
+prepare_database(classify=False, legal_json_path=os.path.join(SRC_DIRECTORY, create_database.LEGAL_JSON_PATH))
+
+app = Flask(__name__)
+
+@app.route('/')
+def hello_world():
+   return '<p>Hello, World!</p>'
+
+@app.route('/hello/')
+@app.route('/hello/<name>')
+def hello(name=None):
+   return render_template('hello.html', name=name, graphJSON = None)
+
+@app.route('/login')
+def login():
+   name = request.args.get('user')
+   return render_template('hello.html', name=name, graphJSON = None)
+
+@app.route('/plotly')
+@app.route('/plotly/<figure>')
+def plotly(figure='password_intervals'):
+   if figure not in figures.FIGURES:
+      abort(404)
+   # the page loads the cached, precompressed JSON of the figure instead of embedding a freshly encoded one
+   return render_template('hello.html', figureURL=url_for('figure_json', name=figure))
+
+@app.route('/figures/<name>.json')
+def figure_json(name):
+   try:
+      encoded = figures.get_figure(name)
+   except KeyError:
+      abort(404)
+   encoding = request.accept_encodings.best_match(encoded.preferred_encodings(), default='identity')
+   response = Response(encoded.encodings[encoding], mimetype='application/json')
+   if encoding != 'identity':
+      response.headers['Content-Encoding'] = encoding
+   response.vary.add('Accept-Encoding')
+   response.set_etag(f'{encoded.version}-{encoding}')
+   response.headers['Cache-Control'] = 'no-cache'
+   return response.make_conditional(request)
+
+def json_response(materialized):
+   """
+   Returns a materialized result as JSON, or 304 Not Modified if the client already has its version.
+   """
+   response = Response(materialized.body, mimetype='application/json')
+   response.set_etag(materialized.version)
+   # clients may keep the response but must revalidate it, which is answered without recomputing anything
+   response.headers['Cache-Control'] = 'no-cache'
+   return response.make_conditional(request)
+
+def positive_int_arg(name, default, maximum=None):
+   value = request.args.get(name, default)
+   try:
+      value = int(value)
+   except ValueError:
+      abort(400, description=f'{name} must be an integer')
+   if value < 1:
+      abort(400, description=f'{name} must be a positive integer')
+   return min(value, maximum) if maximum else value
+
+@app.errorhandler(400)
+def bad_request(error):
+   return {'error': error.description}, 400
+
+@app.route('/api/version')
+def api_version():
+   version = analytics.data_version()
+   return json_response(analytics.Materialized(version, json.dumps({'version': version}).encode()))
+
+@app.route('/api/critical-users')
+def api_critical_users():
+   page = positive_int_arg('page', 1)
+   per_page = positive_int_arg('per_page', analytics.DEFAULT_PAGE_SIZE, analytics.MAX_PAGE_SIZE)
+   # the pages past the last one are all empty: serve the last one instead of caching each of them
+   page = min(page, analytics.critical_users_pages(per_page))
+   return json_response(analytics.materialize('critical_users', analytics.critical_users_page, page, per_page))
+
+@app.route('/api/cohorts')
+def api_cohorts():
+   return json_response(analytics.materialize('cohorts', analytics.cohort_stats))
+
+@app.route('/api/sites/worst')
+def api_worst_sites():
+   limit = positive_int_arg('limit', 5, analytics.MAX_PAGE_SIZE)
+   return json_response(analytics.materialize('worst_sites', analytics.worst_sites, limit))
+
+@app.route('/api/password-intervals')
+def api_password_intervals():
+   return json_response(analytics.materialize('password_intervals', analytics.password_change_intervals))
+
+if __name__ == '__main__':
+   app.run(debug = True)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from memo import data_fingerprint
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MATERIALIZED_CACHE_SIZE = 256
+CRITICAL_USER_COLUMNS = ['id', 'username', 'permissions', 'phishing_emails', 'clicked_emails', 'probability']
+
+_materialized = OrderedDict()
+_materialized_lock = threading.Lock()
+_build_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Materialized:
+    """
+    A result of the analysis serialized as JSON for a version of the data.
+    """
+    version: str
+    body: bytes
+
+
+def data_version():
+    """
+    Returns a short identifier of the current state of the database and the wordlist, used as ETag.
+
+    Returns:
+        str: A hash of memo.data_fingerprint(), which changes on every write to the database or the wordlist.
+        Reads, which is all the analysis functions do, never change it.
+    """
+    return hashlib.sha1(repr(data_fingerprint()).encode()).hexdigest()[:16]
+
+
+def _to_json(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _records(frame):
+    # JSON has no NaN: missing values become null
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def materialize(name, builder, *args):
+    """
+    Returns the JSON serialization of an analysis result, computing it only once per version of the data.
+
+    Results are kept in memory by name and arguments until the data changes, so repeated requests neither recompute
+    nor reserialize them. They are kept in an LRU of MATERIALIZED_CACHE_SIZE entries, and those of older versions
+    of the data are dropped as soon as a result of a new version is built. Builds run one at a time, so concurrent
+    requests after a change compute each result once.
+
+    Args:
+        name (str): The name of the result.
+        builder (function): The function computing the result, which must be serializable as JSON.
+        *args: The arguments of the builder.
+
+    Returns:
+        Materialized: The serialized result and the version of the data it was computed from.
+    """
+    key = (name, args)
+    version = data_version()
+    entry = _get_materialized(key, version)
+    if entry is not None:
+        return entry
+
+    with _build_lock:
+        version = data_version()
+        entry = _get_materialized(key, version)
+        if entry is not None:
+            return entry
+        value = builder(*args)
+        entry = Materialized(version, json.dumps(value, default=_to_json, ensure_ascii=False).encode())
+        with _materialized_lock:
+            for stale in [stale for stale, cached in _materialized.items() if cached.version != version]:
+                del _materialized[stale]
+            _materialized[key] = entry
+            while len(_materialized) > MATERIALIZED_CACHE_SIZE:
+                _materialized.popitem(last=False)
+    return entry
+
+
+def _get_materialized(key, version):
+    with _materialized_lock:
+        entry = _materialized.get(key)
+        if entry is None or entry.version != version:
+            return None
+        _materialized.move_to_end(key)
+        return entry
+
+
+def clear_materialized():
+    """
+    Drops every materialized result of the current process.
+    """
+    with _materialized_lock:
+        _materialized.clear()
+
+
+def critical_users_page(page, per_page):
+    """
+    Returns a page of the users with a weak password, from the most to the least likely to click on a phishing
+    email, with its pagination metadata.
+
+    Only the users of the page are read from the database. The passwords must have been classified, which the
+    ingest and useful_functions.prepare_database do.
+    """
+    from ex4 import count_critical_users, get_critical_users
+
+    total = count_critical_users()
+    users_df = get_critical_users(per_page, (page - 1) * per_page, CRITICAL_USER_COLUMNS[:-1])
+    return {
+        'items': _records(users_df),
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': max(1, math.ceil(total / per_page)),
+    }
+
+
+def critical_users_pages(per_page):
+    """
+    Returns the number of pages of the users with a weak password, at least 1 so that an empty first page can be
+    requested.
+    """
+    from ex4 import count_critical_users
+
+    return max(1, math.ceil(count_critical_users() / per_page))
+
+
+def cohort_stats():
+    """
+    Returns the phishing email statistics of ex3.py, one dictionary per cohort.
+    """
+    from cohorts import cohort_statistics
+
+    stats_df = cohort_statistics()
+    return _records(stats_df.rename_axis('cohort').reset_index())
+
+
+def worst_sites(num_sites):
+    """
+    Returns the sites with the most outdated policies, with the list of their outdated policies.
+    """
+    from ex4 import get_most_outdated_sites
+
+    return [{'name': site, 'outdated_policies': [policy for policy, outdated in policies.items() if outdated]}
+            for site, policies in get_most_outdated_sites(num_sites)]
+
+
+def password_change_intervals():
+    """
+    Returns the average password change interval, in days, of the admin users and of the normal users.
+    """
+    from ex4 import get_password_change_intervals
+
+    intervals = dict(zip(('admin', 'normal'), get_password_change_intervals()))
+    # the mean of a group without users is NaN, which JSON cannot represent
+    return {group: None if math.isnan(interval) else interval for group, interval in intervals.items()}
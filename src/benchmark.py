@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from instrument import peak_rss, reset_peak_rss
+from synthetic import HIT_RATE, generate_dataset
+
+DEFAULT_SCALES = (10, 100, 1000)
+WORKDIR = 'benchmark'
+RESULTS_FILE = 'results.jsonl'
+STAGES = ('ingest', 'crack', 'summary', 'intervals', 'probabilities', 'cohorts', 'sites')
+
+
+def _run_stages(directory):
+    """
+    Runs every stage of the analysis on the dataset of a directory and measures each one.
+
+    It runs in a fresh process started in that directory, where the scripts expect the database and the wordlist,
+    so the memoized results and the peak memory of a scale never leak into the next one.
+    """
+    os.chdir(directory)
+    import cohorts
+    import create_database
+    import db
+    import ex4
+    import summary_statistics
+    import useful_functions
+    from synthetic import LEGAL_FILE, USERS_FILE
+
+    def ingest():
+        with db.connect() as conn:
+            create_database.create_tables(conn)
+            create_database.ingest_users(conn, create_database.iter_users(USERS_FILE))
+            create_database.ingest_sites(conn, create_database.iter_sites(LEGAL_FILE))
+
+    def sites():
+        ex4.get_most_outdated_sites(5)
+        ex4.get_sites_by_year(respecting=True)
+        ex4.get_sites_by_year(respecting=False)
+
+    stages = {
+        'ingest': ingest,
+        'crack': useful_functions.classify_passwords,
+        'summary': summary_statistics.compute_summary_statistics,
+        'intervals': ex4.get_password_change_intervals,
+        'probabilities': lambda: (ex4.probability_of_phishing_emails(),
+                                  ex4.get_users_with_weak_passwords_and_probability()),
+        'cohorts': cohorts.cohort_statistics,
+        'sites': sites,
+    }
+
+    measurements = []
+    for stage in STAGES:
+        per_stage_peak = reset_peak_rss()
+        start = time.perf_counter()
+        stages[stage]()
+        seconds = time.perf_counter() - start
+        measurements.append({'stage': stage, 'seconds': seconds, 'peak_rss': peak_rss(),
+                             'per_stage_peak': per_stage_peak})
+    db.close_pools()
+    return measurements
+
+
+def benchmark_scale(scale, workdir=WORKDIR, seed=0, hit_rate=HIT_RATE, wordlist_size=None):
+    """
+    Generates a synthetic dataset of the given scale and times every stage of the analysis on it.
+
+    The stages run in a separate process on a new database. The peak memory of each stage is the peak resident set
+    size of that process during the stage or, where it cannot be reset, since the process started.
+
+    Args:
+        scale (float): The size of the dataset relative to the shipped one.
+        workdir (str, optional): The directory the datasets are generated in. Defaults to 'benchmark'.
+        seed (int, optional): The seed of the generator. Defaults to 0.
+        hit_rate (float, optional): The fraction of passwords found in the wordlist. Defaults to 0.2.
+        wordlist_size (int, optional): The number of words of the wordlist. Defaults to 1000 per unit of scale.
+
+    Returns:
+        list: A dictionary per stage, with the 'scale', 'users', 'stage', 'seconds' and 'peak_rss' in bytes.
+    """
+    directory = os.path.abspath(os.path.join(workdir, f'scale_{scale:g}'))
+    for name in ('database.db', 'database.db-wal', 'database.db-shm'):
+        if os.path.exists(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+
+    start = time.perf_counter()
+    dataset = generate_dataset(directory, scale, seed, hit_rate, wordlist_size)
+    generation_seconds = time.perf_counter() - start
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        measurements = executor.submit(_run_stages, directory).result()
+
+    common = {'scale': scale, 'seed': seed, 'users': dataset['num_users'], 'sites': dataset['num_sites'],
+              'words': dataset['num_words'], 'hits': dataset['num_hits']}
+    results = [{**common, 'stage': 'generate', 'seconds': generation_seconds, 'peak_rss': None}]
+    results += [{**common, **measurement} for measurement in measurements]
+    return results
+
+
+def print_table(results, file=sys.stdout):
+    """
+    Prints the results of a benchmark as a table with a row per scale and stage.
+
+    Args:
+        results (list): The results, as returned by benchmark_scale.
+        file (file, optional): The stream the table is written to. Defaults to sys.stdout.
+    """
+    print(f"{'scale':>8} {'users':>9} {'stage':<14} {'seconds':>10} {'peak MiB':>9}", file=file)
+    for result in results:
+        peak = f"{result['peak_rss'] / 2 ** 20:9.1f}" if result['peak_rss'] is not None else f"{'-':>9}"
+        print(f"{result['scale']:>8g} {result['users']:>9} {result['stage']:<14} {result['seconds']:>10.3f} {peak}",
+              file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Times every stage of the analysis on synthetic datasets.')
+    parser.add_argument('scales', nargs='*', type=float, default=list(DEFAULT_SCALES),
+                        help='sizes relative to the shipped dataset (default: 10 100 1000)')
+    parser.add_argument('--workdir', default=WORKDIR, help='directory the datasets are generated in')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generator (default: 0)')
+    parser.add_argument('--hit-rate', type=float, default=HIT_RATE,
+                        help=f'fraction of passwords found in the wordlist (default: {HIT_RATE})')
+    parser.add_argument('--wordlist-size', type=int, help='number of words of the wordlist (default: 1000 per scale)')
+    parser.add_argument('--output', help='JSON lines file the results are appended to '
+                                         f'(default: {RESULTS_FILE} in the workdir)')
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(args.workdir, RESULTS_FILE)
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%S')
+    results = []
+    for scale in args.scales:
+        scale_results = benchmark_scale(scale, args.workdir, args.seed, args.hit_rate, args.wordlist_size)
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'a') as results_file:
+            for result in scale_results:
+                results_file.write(json.dumps({'timestamp': timestamp, **result}) + '\n')
+        results += scale_results
+
+    print_table(results)
+    print(f"Results appended to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# the analysis modules are imported inside the subcommands, so --help and the light queries do not load pandas and
+# --profile is enabled before their functions are decorated
+
+# rendering.SUPPORTED_FORMATS
+CHART_FORMATS = ('png', 'svg')
+
+
+class StageTimer:
+    """
+    Records the wall time of the named stages of a command and reports them on stderr.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager that times the enclosed block as a stage of the command.
+
+        Args:
+            name (str): The name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def report(self, file=sys.stderr):
+        """
+        Prints the time of every stage and the total.
+
+        Args:
+            file (file, optional): The stream the times are written to. Defaults to sys.stderr.
+        """
+        width = max([len(name) for name, seconds in self.stages] + [len('total')])
+        for name, seconds in self.stages:
+            print(f"{name:<{width}}  {seconds * 1000:9.1f} ms", file=file)
+        print(f"{'total':<{width}}  {sum(seconds for name, seconds in self.stages) * 1000:9.1f} ms", file=file)
+
+
+def run_ingest(args, timer):
+    with timer.stage('import'):
+        import create_database
+        import db
+
+    with db.connect() as conn:
+        with timer.stage('schema'):
+            create_database.create_tables(conn)
+        with timer.stage('users'):
+            stats = create_database.ingest_users(
+                conn, create_database.iter_users(args.json or create_database.USERS_JSON_PATH),
+                args.batch_size or create_database.BATCH_SIZE, args.incremental, args.history)
+        with timer.stage('sites'):
+            num_sites = create_database.ingest_sites(
+                conn, create_database.iter_sites(args.legal_json or create_database.LEGAL_JSON_PATH),
+                args.batch_size or create_database.BATCH_SIZE, args.incremental)
+
+    print(f"Inserted {stats['users']} users ({stats['updated']} updated, {stats['skipped']} unchanged), "
+          f"{stats['dates']} dates and {stats['ips']} IPs ({stats['rows_per_second']:.0f} rows/s)")
+    if stats['invalid_ips']:
+        print(f"Skipped {stats['invalid_ips']} invalid IPs")
+    print(f"Loaded {num_sites} sites")
+
+    # the analysis only reads the database, so the passwords are classified as part of the ingest
+    with timer.stage('import classifier'):
+        from cracking import get_wordlist_path
+        from useful_functions import classify_passwords
+    wordlist_path = get_wordlist_path()
+    if os.path.exists(wordlist_path):
+        with timer.stage('classify'):
+            classify_passwords()
+        print(f"Classified the passwords against {wordlist_path}")
+    else:
+        print(f"Skipped the classification of the passwords: {wordlist_path} not found")
+
+
+def run_stats(args, timer):
+    with timer.stage('import'):
+        import ex2
+        from summary_statistics import compute_summary_statistics
+        from useful_functions import prepare_database
+
+    with timer.stage('prepare'):
+        prepare_database(classify=False)
+    with timer.stage('compute'):
+        summary = compute_summary_statistics()
+    ex2.print_summary(summary)
+
+
+def run_cohorts(args, timer):
+    with timer.stage('import'):
+        import ex3
+        from cohorts import cohort_statistics
+        from useful_functions import prepare_database
+
+    with timer.stage('prepare'):
+        prepare_database()
+    with timer.stage('compute'):
+        stats_df = cohort_statistics()
+    ex3.print_cohort_statistics(stats_df)
+
+
+def run_crack(args, timer):
+    with timer.stage('import'):
+        import db
+        from cracking import crack_password_hashes, get_wordlist_path, lookup_table_path
+
+    wordlist_path = args.wordlist or get_wordlist_path()
+    if args.hashes:
+        with timer.stage('lookup'):
+            cracked = crack_password_hashes(args.hashes, wordlist_path,
+                                            lookup_table_path(db.get_database_path(), wordlist_path))
+        for password_hash in args.hashes:
+            print(password_hash, cracked.get(password_hash, '-'))
+        return
+
+    with timer.stage('import classifier'):
+        from useful_functions import prepare_database
+
+    with timer.stage('classify'):
+        prepare_database(wordlist_path=wordlist_path)
+    with db.connect() as conn:
+        weak, strong = conn.execute(
+            'SELECT COALESCE(SUM(weak_password = 1), 0), COALESCE(SUM(weak_password = 0), 0) FROM users').fetchone()
+    print("Users with weak passwords:", weak)
+    print("Users with strong passwords:", strong)
+
+
+def run_sites(args, timer):
+    with timer.stage('import'):
+        from ex4 import get_most_outdated_sites, get_sites_by_year
+        from useful_functions import prepare_database
+
+    with timer.stage('prepare'):
+        prepare_database(classify=False)
+    with timer.stage('most outdated'):
+        most_outdated_sites = get_most_outdated_sites(args.top)
+    for site, policies in most_outdated_sites:
+        print(site, ', '.join(policy for policy, outdated in policies.items() if outdated))
+
+    with timer.stage('by year'):
+        respecting = get_sites_by_year(respecting=True)
+        non_respecting = get_sites_by_year(respecting=False)
+    print("Sites respecting privacy", respecting)
+    print("Sites not respecting privacy", non_respecting)
+
+
+def run_report(args, timer):
+    with timer.stage('import'):
+        import ex4
+
+    with timer.stage('report'):
+        ex4.run_report(args.output_dir, args.formats or CHART_FORMATS[:1], args.workers)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m cli', description='Runs the stages of the analysis.')
+    parser.add_argument('--db', help='path to the SQLite database (default: $PRACTICA_DATABASE or database.db)')
+    parser.add_argument('--no-timings', dest='timings', action='store_false',
+                        help='do not print the time of every stage on stderr')
+    parser.add_argument('--profile', choices=('table', 'jsonl'),
+                        help='instrument the analysis functions and print a summary table or JSON lines on stderr')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help='load the users and legal JSON exports into the database')
+    ingest.add_argument('--json', help='path to the users JSON file')
+    ingest.add_argument('--legal-json', help='path to the legal JSON file')
+    ingest.add_argument('--batch-size', type=int, help='users written per transaction')
+    ingest.add_argument('--incremental', action='store_true',
+                        help='upsert users and sites by name instead of rebuilding the tables')
+    ingest.add_argument('--history', choices=['replace', 'append'], default='replace',
+                        help='whether the dates and IPs of updated users replace or extend the stored ones')
+    ingest.set_defaults(func=run_ingest)
+
+    stats = subparsers.add_parser('stats', help='print the summary statistics of ex2')
+    stats.set_defaults(func=run_stats)
+
+    cohorts = subparsers.add_parser('cohorts', help='print the phishing statistics of every cohort, as in ex3')
+    cohorts.set_defaults(func=run_cohorts)
+
+    crack = subparsers.add_parser('crack', help='classify the passwords of the users, or look up the given hashes')
+    crack.add_argument('hashes', nargs='*',
+                       help='hashes to look up instead of classifying the users (MD5, SHA-1, SHA-256 or salted)')
+    crack.add_argument('--wordlist', help='path to the wordlist (default: $PRACTICA_WORDLIST or rockyou.txt)')
+    crack.set_defaults(func=run_crack)
+
+    sites = subparsers.add_parser('sites', help='print the sites with the most outdated policies and by year')
+    sites.add_argument('--top', type=int, default=5, help='number of most outdated sites (default: 5)')
+    sites.set_defaults(func=run_sites)
+
+    report = subparsers.add_parser('report', help='run the whole analysis of ex4')
+    report.add_argument('--output-dir', help='write the charts to this directory instead of showing them')
+    report.add_argument('--format', dest='formats', action='append', choices=CHART_FORMATS,
+                        help='file format of the written charts, may be repeated (default: png)')
+    report.add_argument('--workers', type=int, help='number of processes rendering the charts')
+    report.set_defaults(func=run_report)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        import instrument
+        instrument.enable(args.profile)
+    if args.db:
+        import db
+        db.set_database_path(args.db)
+
+    timer = StageTimer()
+    try:
+        args.func(args, timer)
+    finally:
+        if args.timings:
+            timer.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import pandas as pd
+
+from memo import memoize
+from snapshots import load_table
+
+COHORT_COLUMNS = ['id', 'phone', 'province', 'permissions', 'phishing_emails', 'weak_password']
+
+# every partition splits the users on one column; each value of the column is a cohort
+PARTITIONS = (
+    ('weak_password', ((1, "Weak Password Users"), (0, "Strong Password Users"))),
+    ('permissions', ((1, "Admin Users"), (0, "Non-Admin Users"))),
+)
+
+
+@memoize()
+def load_users():
+    """
+    Loads the columns needed by the cohorts of every user in a single query.
+
+    The passwords must have been classified, so the weak_password column is filled in.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the COHORT_COLUMNS of every user.
+    """
+    return load_table('users', COHORT_COLUMNS)
+
+
+def cohort_masks(users_df):
+    """
+    Returns the boolean mask selecting the users of every cohort.
+
+    Args:
+        users_df (pandas.DataFrame): The users, as returned by load_users.
+
+    Returns:
+        dict: A dictionary where the keys are the cohort labels and the values are boolean Series aligned with users_df.
+    """
+    return {label: users_df[column] == value for column, values in PARTITIONS for value, label in values}
+
+
+def get_cohort(users_df, label):
+    """
+    Returns the users of a cohort.
+
+    Args:
+        users_df (pandas.DataFrame): The users, as returned by load_users.
+        label (str): The label of the cohort, e.g. "Admin Users".
+
+    Returns:
+        pandas.DataFrame: The rows of users_df that belong to the cohort.
+
+    Raises:
+        KeyError: If there is no cohort with that label.
+    """
+    for column, values in PARTITIONS:
+        for value, cohort_label in values:
+            if cohort_label == label:
+                return users_df[users_df[column] == value]
+    raise KeyError(f"Unknown cohort: {label}")
+
+
+@memoize()
+def cohort_statistics(users_df=None):
+    """
+    Computes the statistics of ex3.py for every cohort.
+
+    Each partition is aggregated with a single groupby, so the users are only loaded once and every cohort is
+    computed in one pass over its partition column.
+
+    Args:
+        users_df (pandas.DataFrame, optional): The users, as returned by load_users. Loaded if not given.
+
+    Returns:
+        pandas.DataFrame: A DataFrame indexed by cohort label with the number of samples, the number of missing
+        values (i.e. "None" phones and provinces) and the median, mean, variance, min and max of phishing emails.
+    """
+    if users_df is None:
+        users_df = load_users()
+
+    missing_values = (users_df['province'] == "None").astype(int) + (users_df['phone'] == "None").astype(int)
+    frame = users_df.assign(missing_values=missing_values)
+
+    partitions = []
+    for column, values in PARTITIONS:
+        grouped = frame.groupby(column).agg(
+            num_samples=('phishing_emails', 'size'),
+            missing_values=('missing_values', 'sum'),
+            median=('phishing_emails', 'median'),
+            mean=('phishing_emails', 'mean'),
+            var=('phishing_emails', 'var'),
+            min=('phishing_emails', 'min'),
+            max=('phishing_emails', 'max'),
+        )
+        grouped = grouped.reindex([value for value, label in values])
+        grouped.index = [label for value, label in values]
+        partitions.append(grouped)
+
+    stats_df = pd.concat(partitions)
+    stats_df[['num_samples', 'missing_values']] = stats_df[['num_samples', 'missing_values']].fillna(0).astype(int)
+    return stats_df
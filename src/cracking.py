@@ -0,0 +1,537 @@
+import hashlib
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from hash_backends import BACKENDS, BATCH_SIZE, group_by_format
+from instrument import instrumented
+
+WORDLIST_PATH = os.environ.get('PRACTICA_WORDLIST', 'rockyou.txt')
+CHUNK_SIZE = 8 << 20
+
+TABLE_SUFFIX = '.md5idx'
+TABLE_MAGIC = b'MD5IDX01'
+TABLE_HEADER = struct.Struct('<8sQqQ')  # magic, wordlist size, wordlist mtime_ns, number of records
+TABLE_RECORD = struct.Struct('<16sQ')  # md5 digest, offset of the word in the wordlist
+
+_wordlist_path = WORDLIST_PATH
+_targets = {}
+_stop_event = None
+_found_flags = None
+
+
+def get_wordlist_path():
+    """
+    Returns the path of the wordlist used by default, taken from the PRACTICA_WORDLIST environment variable or
+    'rockyou.txt'.
+
+    Returns:
+        str: The path to the wordlist.
+    """
+    return _wordlist_path
+
+
+def set_wordlist_path(wordlist_path):
+    """
+    Changes the wordlist used by default to classify the passwords and to key the cached results.
+
+    Args:
+        wordlist_path (str): The path to the wordlist.
+    """
+    global _wordlist_path
+    _wordlist_path = wordlist_path
+
+
+def _init_worker(targets, stop_event):
+    global _targets, _stop_event
+    _targets = targets
+    _stop_event = stop_event
+
+
+def _init_salted_worker(found_flags):
+    global _found_flags
+    _found_flags = found_flags
+
+
+def decode_word(line):
+    """
+    Returns the word of a raw wordlist line, decoded as latin-1 and stripped of surrounding whitespace.
+
+    Args:
+        line (bytes): A line of the wordlist, with or without its line terminator.
+
+    Returns:
+        str: The word.
+    """
+    return line.decode('latin-1').strip()
+
+
+def md5_word(line):
+    """
+    Hashes a raw wordlist line the same way the dictionary has always been read.
+
+    The line is decoded as latin-1, stripped of surrounding whitespace and encoded back as UTF-8 before hashing.
+
+    Args:
+        line (bytes): A line of the wordlist, with or without its line terminator.
+
+    Returns:
+        tuple: The stripped word and its MD5 hex digest.
+    """
+    word = decode_word(line)
+    return word, hashlib.md5(word.encode()).hexdigest()
+
+
+def split_ranges(wordlist_path, chunk_size=CHUNK_SIZE):
+    """
+    Splits a wordlist file into byte ranges that start and end on line boundaries.
+
+    Args:
+        wordlist_path (str): The path to the wordlist.
+        chunk_size (int, optional): The approximate size in bytes of every range. Defaults to 8 MiB.
+
+    Returns:
+        list: A list of (start, end) byte offsets covering the whole file.
+    """
+    size = os.path.getsize(wordlist_path)
+    if size == 0:
+        return []
+
+    ranges = []
+    with open(wordlist_path, 'rb') as wordlist, mmap.mmap(wordlist.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            newline = mm.find(b'\n', min(start + chunk_size, size) - 1)
+            end = size if newline == -1 else newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _iter_batches(wordlist_path, start, end, stopped=None, batch_size=BATCH_SIZE):
+    """
+    Yields the words of a byte range of the wordlist in batches of batch_size, with the offset of every word.
+
+    Stops early once stopped, a function called before every batch, returns True.
+    """
+    with open(wordlist_path, 'rb') as wordlist, mmap.mmap(wordlist.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        lines = mm[start:end].splitlines(keepends=True)
+    offset = start
+    for first in range(0, len(lines), batch_size):
+        if stopped is not None and stopped():
+            break
+        words, offsets = [], []
+        for line in lines[first:first + batch_size]:
+            words.append(decode_word(line))
+            offsets.append(offset)
+            offset += len(line)
+        yield words, offsets
+
+
+def _crack_range(wordlist_path, start, end, targets=None, stop_event=None):
+    """
+    Hashes every line in a byte range of the wordlist with every unsalted backend of the targets, a batch at a time,
+    and keeps the ones matching the targets.
+
+    Returns:
+        dict: A dictionary mapping every matched stored hash to its (offset, word).
+    """
+    targets = _targets if targets is None else targets
+    stop_event = _stop_event if stop_event is None else stop_event
+    found = {}
+
+    stopped = stop_event.is_set if stop_event is not None else None
+    for words, offsets in _iter_batches(wordlist_path, start, end, stopped):
+        for backend, wanted in targets.items():
+            for index, digest in enumerate(BACKENDS[backend].hash_batch(words)):
+                for stored in wanted.get(digest, ()):
+                    if stored not in found:
+                        found[stored] = (offsets[index], words[index])
+    return found
+
+
+def _crack_salted_range(wordlist_path, start, end, parsed, flag=None):
+    """
+    Hashes every line in a byte range of the wordlist with the salt of a stored hash, a batch at a time, until one
+    matches it or, in a worker, its found flag is set by another task.
+
+    Returns:
+        tuple: The (offset, word) of the first match, or None.
+    """
+    backend = BACKENDS[parsed.backend]
+    stopped = (lambda: _found_flags[flag]) if flag is not None and _found_flags is not None else None
+    for words, offsets in _iter_batches(wordlist_path, start, end, stopped, backend.batch_size):
+        for index, digest in enumerate(backend.hash_batch(words, parsed)):
+            if digest == parsed.digest:
+                return offsets[index], words[index]
+    return None
+
+
+def _merge(found, partial):
+    for stored, match in partial.items():
+        if stored not in found or match[0] < found[stored][0]:
+            found[stored] = match
+
+
+def _in_wordlist_order(found, offsets=False):
+    matches = sorted(found.items(), key=lambda item: item[1][0])
+    return {stored: match if offsets else match[1] for stored, match in matches}
+
+
+@instrumented()
+def crack_hashes(hashes, wordlist_path=WORDLIST_PATH, workers=None, chunk_size=CHUNK_SIZE, offsets=False):
+    """
+    Finds the wordlist entries whose unsalted digest is one of the given hashes.
+
+    The format of every hash (MD5, SHA-1 or SHA-256 hex digests) is detected and the targets of each format are
+    indexed in a set. The memory-mapped wordlist is split into line-aligned byte ranges that are hashed on a process
+    pool, in batches, once per format present. The search stops as soon as every distinct hash has been found.
+    Salted hashes and hashes in unknown formats are ignored.
+
+    Args:
+        hashes (iterable): The hex digests to look for.
+        wordlist_path (str, optional): The path to the wordlist. Defaults to 'rockyou.txt'.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs; 1 runs in-process.
+        chunk_size (int, optional): The approximate size in bytes of the range given to each task. Defaults to 8 MiB.
+        offsets (bool, optional): Whether to map every cracked hash to the (offset, plaintext) of its wordlist entry
+            instead of its plaintext. Defaults to False.
+
+    Returns:
+        dict: A dictionary mapping every cracked hash to its plaintext, in wordlist order.
+    """
+    targets = {}
+    num_targets = 0
+    for backend, parsed_hashes in group_by_format(hashes).items():
+        if BACKENDS[backend].salted:
+            continue
+        wanted = targets.setdefault(backend, {})
+        for stored, parsed in parsed_hashes.items():
+            wanted.setdefault(parsed.digest, []).append(stored)
+            num_targets += 1
+    if not targets:
+        return {}
+
+    ranges = split_ranges(wordlist_path, chunk_size)
+    if not ranges:
+        return {}
+    workers = workers or os.cpu_count() or 1
+    found = {}
+
+    if workers == 1 or len(ranges) == 1:
+        for start, end in ranges:
+            _merge(found, _crack_range(wordlist_path, start, end, targets))
+            if len(found) == num_targets:
+                break
+    else:
+        context = multiprocessing.get_context()
+        stop_event = context.Event()
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=context,
+                                 initializer=_init_worker, initargs=(targets, stop_event)) as executor:
+            futures = [executor.submit(_crack_range, wordlist_path, start, end) for start, end in ranges]
+            for future in as_completed(futures):
+                _merge(found, future.result())
+                if len(found) == num_targets:
+                    stop_event.set()
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+    return _in_wordlist_order(found, offsets)
+
+
+@instrumented()
+def crack_salted_hashes(hashes, wordlist_path=WORDLIST_PATH, workers=None, chunk_size=CHUNK_SIZE, offsets=False):
+    """
+    Finds the wordlist entries of the given salted hashes.
+
+    Every salted hash has to be checked against the whole wordlist with its own salt, so the work is fanned out over
+    a process pool as one task per hash and line-aligned byte range of the wordlist. The tasks are submitted as
+    others finish, with at most twice as many in flight as workers, so the number of hashes does not bound the
+    memory. As soon as a hash is found, its remaining tasks are skipped and its running ones stop at their next
+    batch, through a flag per hash in shared memory. Unsalted hashes and hashes in unknown formats are ignored.
+
+    Args:
+        hashes (iterable): The stored hashes to look for, e.g. 'sha1$<salt>$<hex digest>'.
+        wordlist_path (str, optional): The path to the wordlist. Defaults to 'rockyou.txt'.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs; 1 runs in-process.
+        chunk_size (int, optional): The approximate size in bytes of the range given to each task. Defaults to 8 MiB.
+        offsets (bool, optional): Whether to map every cracked hash to the (offset, plaintext) of its wordlist entry
+            instead of its plaintext. Defaults to False.
+
+    Returns:
+        dict: A dictionary mapping every cracked hash to its plaintext, in wordlist order.
+    """
+    salted = {stored: parsed
+              for backend, parsed_hashes in group_by_format(hashes).items() if BACKENDS[backend].salted
+              for stored, parsed in parsed_hashes.items()}
+    if not salted:
+        return {}
+
+    ranges = split_ranges(wordlist_path, chunk_size)
+    if not ranges:
+        return {}
+    workers = workers or os.cpu_count() or 1
+    found = {}
+
+    if workers == 1 or len(salted) * len(ranges) == 1:
+        for stored, parsed in salted.items():
+            for start, end in ranges:
+                match = _crack_salted_range(wordlist_path, start, end, parsed)
+                if match is not None:
+                    found[stored] = match
+                    break
+    else:
+        context = multiprocessing.get_context()
+        found_flags = context.Array('b', len(salted), lock=False)
+        with ProcessPoolExecutor(max_workers=min(workers, len(salted) * len(ranges)), mp_context=context,
+                                 initializer=_init_salted_worker, initargs=(found_flags,)) as executor:
+            tasks = ((flag, stored, parsed, start, end)
+                     for flag, (stored, parsed) in enumerate(salted.items()) for start, end in ranges)
+            # future -> (flag, stored hash), refilled up to max_in_flight as the tasks finish
+            running = {}
+            max_in_flight = 2 * workers
+            while True:
+                if len(running) < max_in_flight:
+                    for flag, stored, parsed, start, end in tasks:
+                        if stored in found:
+                            continue
+                        future = executor.submit(_crack_salted_range, wordlist_path, start, end, parsed, flag)
+                        running[future] = (flag, stored)
+                        if len(running) >= max_in_flight:
+                            break
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    flag, stored = running.pop(future)
+                    match = future.result()
+                    if match is None or (stored in found and found[stored][0] <= match[0]):
+                        continue
+                    found_flags[flag] = 1
+                    found[stored] = match
+
+    return _in_wordlist_order(found, offsets)
+
+
+def _digest_range(wordlist_path, start, end):
+    """
+    Hashes every line in a byte range of the wordlist.
+
+    Returns:
+        bytes: The packed (digest, offset) table records of the range.
+    """
+    records = bytearray()
+    with open(wordlist_path, 'rb') as wordlist, mmap.mmap(wordlist.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offset = start
+        for line in mm[start:end].splitlines(keepends=True):
+            word, digest = md5_word(line)
+            records += TABLE_RECORD.pack(bytes.fromhex(digest), offset)
+            offset += len(line)
+    return bytes(records)
+
+
+def lookup_table_path(database_path, wordlist_path=WORDLIST_PATH):
+    """
+    Returns the path of the precomputed lookup table of a wordlist, stored next to the database.
+
+    Args:
+        database_path (str): The path to the SQLite database.
+        wordlist_path (str, optional): The path to the wordlist. Defaults to 'rockyou.txt'.
+
+    Returns:
+        str: The path of the lookup table.
+    """
+    directory = os.path.dirname(os.path.abspath(database_path))
+    return os.path.join(directory, os.path.basename(wordlist_path) + TABLE_SUFFIX)
+
+
+def wordlist_fingerprint(wordlist_path):
+    """
+    Returns the size and modification time of a wordlist, used to detect when it changes.
+
+    Args:
+        wordlist_path (str): The path to the wordlist.
+
+    Returns:
+        tuple: The size in bytes and the modification time in nanoseconds of the file.
+    """
+    stat = os.stat(wordlist_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _read_table_header(table_path):
+    try:
+        with open(table_path, 'rb') as table:
+            header = table.read(TABLE_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) != TABLE_HEADER.size:
+        return None
+    magic, size, mtime_ns, count = TABLE_HEADER.unpack(header)
+    if magic != TABLE_MAGIC:
+        return None
+    return size, mtime_ns, count
+
+
+@instrumented()
+def build_lookup_table(wordlist_path, table_path, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Builds the sorted binary table of (md5 digest, wordlist offset) records of a wordlist.
+
+    The wordlist is hashed on a process pool and the records are sorted by digest. When a word appears several times,
+    only its first occurrence is kept. The table is written to a temporary file and then moved into place.
+
+    Args:
+        wordlist_path (str): The path to the wordlist.
+        table_path (str): The path where the table is written.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs; 1 runs in-process.
+        chunk_size (int, optional): The approximate size in bytes of the range given to each task. Defaults to 8 MiB.
+
+    Returns:
+        int: The number of records in the table.
+    """
+    import numpy as np
+
+    size, mtime_ns = wordlist_fingerprint(wordlist_path)
+    ranges = split_ranges(wordlist_path, chunk_size)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(ranges) <= 1:
+        parts = [_digest_range(wordlist_path, start, end) for start, end in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+            starts, ends = zip(*ranges)
+            parts = list(executor.map(_digest_range, [wordlist_path] * len(ranges), starts, ends))
+
+    record_type = np.dtype([('digest', 'S16'), ('offset', '<u8')])
+    records = np.frombuffer(b''.join(parts), dtype=record_type).copy()
+    records.sort(order=['digest', 'offset'])
+    if len(records):
+        first = np.ones(len(records), dtype=bool)
+        first[1:] = records['digest'][1:] != records['digest'][:-1]
+        records = records[first]
+
+    # a name of its own, so concurrent builds of the same table never write to each other's file
+    temporary_path = f'{table_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary_path, 'wb') as table:
+        table.write(TABLE_HEADER.pack(TABLE_MAGIC, size, mtime_ns, len(records)))
+        table.write(records.tobytes())
+    os.replace(temporary_path, table_path)
+    return len(records)
+
+
+def ensure_lookup_table(wordlist_path, table_path, workers=None):
+    """
+    Builds the lookup table of a wordlist unless an up-to-date one already exists.
+
+    The table is rebuilt whenever the size or the modification time of the wordlist differ from the ones it was
+    built from.
+
+    Args:
+        wordlist_path (str): The path to the wordlist.
+        table_path (str): The path of the lookup table.
+        workers (int, optional): The number of worker processes used if the table has to be built.
+
+    Returns:
+        bool: True if the table was (re)built, False if the existing one was reused.
+    """
+    header = _read_table_header(table_path)
+    if header is not None and header[:2] == wordlist_fingerprint(wordlist_path):
+        return False
+    build_lookup_table(wordlist_path, table_path, workers)
+    return True
+
+
+@instrumented()
+def lookup_hashes(hashes, wordlist_path=WORDLIST_PATH, table_path=None, workers=None, offsets=False):
+    """
+    Finds the wordlist entries of the given MD5 hashes with a binary search over the precomputed lookup table.
+
+    The table is built first if it is missing or stale. Both the table and the wordlist are memory-mapped, so every
+    lookup only touches a handful of pages.
+
+    Args:
+        hashes (iterable): The MD5 hex digests to look for.
+        wordlist_path (str, optional): The path to the wordlist. Defaults to 'rockyou.txt'.
+        table_path (str, optional): The path of the lookup table. Defaults to the wordlist path plus '.md5idx'.
+        workers (int, optional): The number of worker processes used if the table has to be built.
+        offsets (bool, optional): Whether to map every cracked hash to the (offset, plaintext) of its wordlist entry
+            instead of its plaintext. Defaults to False.
+
+    Returns:
+        dict: A dictionary mapping every cracked hash to its plaintext, in wordlist order.
+    """
+    table_path = table_path or wordlist_path + TABLE_SUFFIX
+    ensure_lookup_table(wordlist_path, table_path, workers)
+    count = _read_table_header(table_path)[2]
+    if count == 0:
+        return {}
+
+    found = {}
+    with open(table_path, 'rb') as table, mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+            open(wordlist_path, 'rb') as wordlist, \
+            mmap.mmap(wordlist.fileno(), 0, access=mmap.ACCESS_READ) as words:
+        for digest in set(hashes):
+            try:
+                key = bytes.fromhex(digest)
+            except (TypeError, ValueError):
+                continue
+            if len(key) != 16:
+                continue
+
+            low, high = 0, count
+            while low < high:
+                middle = (low + high) // 2
+                position = TABLE_HEADER.size + middle * TABLE_RECORD.size
+                if mm[position:position + 16] < key:
+                    low = middle + 1
+                else:
+                    high = middle
+
+            position = TABLE_HEADER.size + low * TABLE_RECORD.size
+            if low < count and mm[position:position + 16] == key:
+                offset = TABLE_RECORD.unpack_from(mm, position)[1]
+                end = words.find(b'\n', offset)
+                lines = words[offset:end if end != -1 else len(words)].splitlines()
+                found[digest] = (offset, decode_word(lines[0] if lines else b''))
+
+    return _in_wordlist_order(found, offsets)
+
+
+@instrumented()
+def crack_password_hashes(hashes, wordlist_path=WORDLIST_PATH, table_path=None, workers=None):
+    """
+    Finds the wordlist entries of stored password hashes in any of the formats of hash_backends.BACKENDS.
+
+    The format of every hash is detected and the cheapest method is used for each one: the MD5 digests are looked up
+    in the precomputed table, the other unsalted digests are checked against sets in a single scan of the wordlist,
+    and only then are the salted hashes checked one by one on a process pool.
+
+    Args:
+        hashes (iterable): The stored hashes, in any mix of formats. Hashes in an unknown format are never cracked.
+        wordlist_path (str, optional): The path to the wordlist. Defaults to 'rockyou.txt'.
+        table_path (str, optional): The path of the MD5 lookup table. Defaults to the wordlist path plus '.md5idx'.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        dict: A dictionary mapping every cracked hash to its plaintext, in wordlist order.
+    """
+    groups = group_by_format(hashes)
+    found = {}
+    if 'md5' in groups:
+        found.update(lookup_hashes(groups['md5'], wordlist_path, table_path, workers, offsets=True))
+
+    unsalted = [stored for backend, parsed_hashes in groups.items()
+                if backend != 'md5' and not BACKENDS[backend].salted for stored in parsed_hashes]
+    if unsalted:
+        found.update(crack_hashes(unsalted, wordlist_path, workers, offsets=True))
+
+    salted = [stored for backend, parsed_hashes in groups.items() if BACKENDS[backend].salted
+              for stored in parsed_hashes]
+    if salted:
+        found.update(crack_salted_hashes(salted, wordlist_path, workers, offsets=True))
+
+    return _in_wordlist_order(found)
@@ -1,66 +1,636 @@
-import sqlite3
+import argparse
+import datetime
+import hashlib
+import ipaddress
 import json
+import os
+import sqlite3
+import time
+import uuid
+
+import db
+from site_compliance import POLICIES
+
+USERS_JSON_PATH = '../datos/users_data_online.json'
+LEGAL_JSON_PATH = '../datos/legal_data_online.json'
+BATCH_SIZE = 5000
+READ_CHUNK_SIZE = 1 << 20
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# probability of a user clicking on a phishing email, 0 for the users that received none
+PHISHING_PROBABILITY = ("CASE WHEN phishing_emails != 0 THEN CAST(clicked_emails AS REAL) / phishing_emails "
+                        "ELSE 0 END")
+# columns of the users table that come from the export, without the ones derived by the ingest and the classification
+USER_COLUMNS = ('id', 'username', 'phone', 'password_hash', 'province', 'permissions', 'total_emails',
+                'phishing_emails', 'clicked_emails')
+
+INSERT_USER = '''
+    INSERT INTO users (username, phone, password_hash, province, permissions, total_emails, phishing_emails, clicked_emails,
+                       content_hash, id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+# the weak_password flag is kept only if the password did not change
+UPDATE_USER = '''
+    UPDATE users SET username = ?, phone = ?, password_hash = ?, province = ?, permissions = ?, total_emails = ?,
+        phishing_emails = ?, clicked_emails = ?, content_hash = ?,
+        weak_password = CASE WHEN password_hash IS ?3 THEN weak_password END
+    WHERE id = ?
+'''
+INSERT_DATE = 'INSERT INTO dates (user_id, date, day) VALUES (?, ?, ?)'
+# repeated IPs of a user are stored once, with the number of times they were seen
+INSERT_IP = '''
+    INSERT INTO ips (user_id, address, occurrences) VALUES (?, ?, ?)
+    ON CONFLICT (user_id, address) DO UPDATE SET occurrences = occurrences + excluded.occurrences
+'''
+UPSERT_SITE = '''
+    INSERT INTO sites (name, cookies, aviso, proteccion_de_datos, creation_year, outdated_policies)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (name) DO UPDATE SET cookies = excluded.cookies, aviso = excluded.aviso,
+        proteccion_de_datos = excluded.proteccion_de_datos, creation_year = excluded.creation_year,
+        outdated_policies = excluded.outdated_policies
+    WHERE cookies IS NOT excluded.cookies OR aviso IS NOT excluded.aviso
+        OR proteccion_de_datos IS NOT excluded.proteccion_de_datos OR creation_year IS NOT excluded.creation_year
+        OR outdated_policies IS NOT excluded.outdated_policies
+'''
+
+
+def create_tables(conn):
+    """
+    Creates the users, dates, ips, sites and metadata tables if they do not exist yet, and migrates older schemas.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT,
+            phone TEXT,
+            password_hash TEXT,
+            province TEXT,
+            permissions INTEGER,
+            total_emails INTEGER,
+            phishing_emails INTEGER,
+            clicked_emails INTEGER,
+            weak_password INTEGER,
+            content_hash TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dates (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            date TEXT,
+            day INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ips (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            address INTEGER,
+            occurrences INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            UNIQUE (user_id, address)
+        )
+    ''')
+    cursor.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)')
+    cursor.execute("INSERT OR IGNORE INTO metadata (key, value) VALUES ('database_id', ?)", (uuid.uuid4().hex,))
+    cursor.execute("INSERT OR IGNORE INTO metadata (key, value) VALUES ('data_version', 0)")
+    conn.commit()
+    ensure_weak_password_column(conn)
+    ensure_date_day_column(conn)
+    ensure_ip_address_schema(conn)
+    create_sites_table(conn)
+
+
+def bump_data_version(conn):
+    """
+    Records a write to the data of the database, which makes the snapshots exported before it stale.
+
+    Every function writing to the tables calls it inside the transaction of its write, so no reader can see the new
+    data with the old version. Writes made outside these functions are not detected.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database, inside the transaction of the write.
+    """
+    conn.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)')
+    conn.execute("INSERT OR IGNORE INTO metadata (key, value) VALUES ('database_id', ?)", (uuid.uuid4().hex,))
+    conn.execute("INSERT INTO metadata (key, value) VALUES ('data_version', 1) "
+                 "ON CONFLICT (key) DO UPDATE SET value = value + 1")
+
+
+def get_data_version(conn):
+    """
+    Returns the version of the data of the database, which changes on every write.
+
+    The version combines a random identifier of the database, set when its tables are created, with the number of
+    writes, so a database rebuilt at the same path never reuses the version of the previous one.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+
+    Returns:
+        str: The version, or None if the tables were never created.
+    """
+    try:
+        values = dict(conn.execute("SELECT key, value FROM metadata WHERE key IN ('database_id', 'data_version')"))
+    except sqlite3.OperationalError:
+        return None
+    if 'database_id' not in values:
+        return None
+    return f"{values['database_id']}:{values.get('data_version', 0)}"
+
+
+def ip_to_int(ip):
+    """
+    Converts a dotted-quad IPv4 address into its 32-bit integer value.
+
+    Args:
+        ip (str): The address, e.g. '226.1.84.70'.
+
+    Returns:
+        int: The address as an unsigned 32-bit integer.
+
+    Raises:
+        ValueError: If the text is not a valid IPv4 address.
+    """
+    return int(ipaddress.IPv4Address(ip))
+
+
+def _ip_to_int_or_none(ip):
+    try:
+        return ip_to_int(ip)
+    except ValueError:
+        return None
+
+
+def _as_list(value):
+    # missing lists are exported as the string "None"
+    return value if isinstance(value, list) else []
+
+
+def ensure_ip_address_schema(conn):
+    """
+    Converts an ips table with dotted-quad TEXT rows into integer addresses with per-user occurrence counts,
+    and creates the index on address if it does not exist yet. Rows that are not valid IPv4 addresses are dropped.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+    """
+    columns = [column[1] for column in conn.execute('PRAGMA table_info(ips)')]
+    if 'address' not in columns:
+        conn.create_function('ip_to_int', 1, _ip_to_int_or_none, deterministic=True)
+        with conn:
+            conn.execute('ALTER TABLE ips RENAME TO ips_text')
+            conn.execute('''
+                CREATE TABLE ips (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER,
+                    address INTEGER,
+                    occurrences INTEGER,
+                    FOREIGN KEY (user_id) REFERENCES users (id),
+                    UNIQUE (user_id, address)
+                )
+            ''')
+            conn.execute('''
+                INSERT INTO ips (user_id, address, occurrences)
+                SELECT user_id, ip_to_int(ip) AS address, COUNT(*) FROM ips_text
+                WHERE address IS NOT NULL
+                GROUP BY user_id, address
+                ORDER BY MIN(id)
+            ''')
+            conn.execute('DROP TABLE ips_text')
+            bump_data_version(conn)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_ips_address ON ips (address)')
+    conn.commit()
+
+
+def ensure_upsert_schema(conn):
+    """
+    Adds the content_hash column of the users table and the unique index on username if they do not exist yet.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+
+    Raises:
+        ValueError: If the users table has duplicated usernames, left by the ingest before it upserted users.
+    """
+    columns = [column[1] for column in conn.execute('PRAGMA table_info(users)')]
+    if 'content_hash' not in columns:
+        conn.execute('ALTER TABLE users ADD COLUMN content_hash TEXT')
+    try:
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)')
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        raise ValueError("The users table has duplicated usernames; run a full ingest to rebuild it.")
+    conn.commit()
+
+
+def content_hash(user_info):
+    """
+    Returns a hash of the content of a user record, used to skip unchanged users in incremental ingests.
+
+    Args:
+        user_info (dict): The information of a user, as found in the users JSON file.
+
+    Returns:
+        str: The SHA-1 hex digest of the record serialized with sorted keys.
+    """
+    return hashlib.sha1(json.dumps(user_info, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def create_sites_table(conn):
+    """
+    Creates the sites table of legal_data_online.json and its indexes if they do not exist yet.
+
+    Besides the policy flags and the creation year, every site stores its number of outdated policies (i.e. policies
+    equal to 0), so the most outdated sites can be ranked with an index.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sites (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE,
+            cookies INTEGER,
+            aviso INTEGER,
+            proteccion_de_datos INTEGER,
+            creation_year INTEGER,
+            outdated_policies INTEGER
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sites_outdated ON sites (outdated_policies)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sites_compliance ON sites (cookies, aviso, proteccion_de_datos)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sites_year ON sites (creation_year)')
+    conn.commit()
+
+
+def date_to_day(date):
+    """
+    Converts a day/month/year date string into the number of days since 1970-01-01.
+
+    Args:
+        date (str): The date, formatted as %d/%m/%Y.
+
+    Returns:
+        int: The number of days between 1970-01-01 and the date.
+    """
+    day, month, year = date.split('/')
+    return datetime.date(int(year), int(month), int(day)).toordinal() - EPOCH_ORDINAL
+
+
+def ensure_date_day_column(conn):
+    """
+    Adds the day column of the dates table and its indexes if they do not exist yet.
+
+    The day column stores every date as the number of days since 1970-01-01, so dates can be sorted, subtracted and
+    filtered by range inside SQLite. When the column is added, the existing rows are backfilled from the date text;
+    the ingest fills it for every new row. The (user_id, day) index serves the per-user aggregations and histories,
+    and the day index the date ranges.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+    """
+    columns = [column[1] for column in conn.execute('PRAGMA table_info(dates)')]
+    if 'day' not in columns:
+        conn.execute('ALTER TABLE dates ADD COLUMN day INTEGER')
+        rows = conn.execute('SELECT id, date FROM dates').fetchall()
+        conn.executemany('UPDATE dates SET day = ? WHERE id = ?',
+                         [(date_to_day(date), row_id) for row_id, date in rows])
+        bump_data_version(conn)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_dates_user_day ON dates (user_id, day)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_dates_day ON dates (day)')
+    conn.commit()
+
+
+def ensure_weak_password_column(conn):
+    """
+    Adds the weak_password column of the users table and its indexes if they do not exist yet.
+
+    The column is NULL until the password of the user has been checked against the dictionary, then 1 if it was
+    cracked and 0 otherwise. The metadata table records which dictionary the flags were computed with. The users
+    with weak passwords are also indexed by decreasing phishing probability, so the most critical ones are read in
+    order without sorting the table.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+    """
+    columns = [column[1] for column in conn.execute('PRAGMA table_info(users)')]
+    if 'weak_password' not in columns:
+        conn.execute('ALTER TABLE users ADD COLUMN weak_password INTEGER')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_weak_password ON users (weak_password)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_users_critical '
+                 f'ON users (weak_password, {PHISHING_PROBABILITY} DESC, id)')
+    conn.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)')
+    conn.commit()
+
+
+def iter_users(file_path, chunk_size=READ_CHUNK_SIZE):
+    """
+    Lazily yields the entries of the "usuarios" array of a users JSON file.
+
+    Args:
+        file_path (str): The path to the users JSON file.
+        chunk_size (int, optional): The number of characters read from the file at a time. Defaults to 1 MiB.
+
+    Yields:
+        dict: A single-key dictionary mapping a username to its information.
+    """
+    return iter_array(file_path, 'usuarios', chunk_size)
+
+
+def iter_sites(file_path, chunk_size=READ_CHUNK_SIZE):
+    """
+    Lazily yields the entries of the "legal" array of a legal JSON file.
+
+    Args:
+        file_path (str): The path to the legal JSON file.
+        chunk_size (int, optional): The number of characters read from the file at a time. Defaults to 1 MiB.
+
+    Yields:
+        dict: A single-key dictionary mapping a site name to its information.
+    """
+    return iter_array(file_path, 'legal', chunk_size)
+
+
+def iter_array(file_path, key, chunk_size=READ_CHUNK_SIZE):
+    """
+    Lazily yields the entries of a top-level array of a JSON file.
+
+    The file is read in chunks of chunk_size characters and every entry of the array is decoded on its own,
+    so only the entry being decoded has to be kept in memory instead of the whole document.
+
+    Args:
+        file_path (str): The path to the JSON file.
+        key (str): The key of the array, e.g. "usuarios".
+        chunk_size (int, optional): The number of characters read from the file at a time. Defaults to 1 MiB.
+
+    Yields:
+        The decoded entries of the array.
+
+    Raises:
+        ValueError: If the file has no such array or the array is not terminated.
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path) as json_file:
+        buffer = json_file.read(chunk_size)
+
+        # find the opening bracket of the array
+        while True:
+            key_position = buffer.find(f'"{key}"')
+            bracket = buffer.find('[', key_position) if key_position != -1 else -1
+            if bracket != -1:
+                position = bracket + 1
+                break
+            chunk = json_file.read(chunk_size)
+            if not chunk:
+                raise ValueError(f'No "{key}" array found in {file_path}')
+            buffer += chunk
+
+        error = None
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+
+            if position < len(buffer) and buffer[position] == ']':
+                return
+
+            if position < len(buffer):
+                try:
+                    user, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError as exc:
+                    # the entry may continue in the next chunk
+                    error = exc
+                else:
+                    error = None
+                    yield user
+                    continue
+
+            chunk = json_file.read(chunk_size)
+            if not chunk:
+                if error is not None:
+                    raise error
+                raise ValueError(f'Unterminated "{key}" array in {file_path}')
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def ingest_users(conn, users, batch_size=BATCH_SIZE, incremental=False, history='replace'):
+    """
+    Loads users with their dates and IPs into the database in batches.
+
+    Users are keyed on their username. A full ingest first empties the users, dates and ips tables. An incremental
+    ingest keeps them: new users are inserted, users whose record changed are updated and their dates and IPs are
+    replaced, or appended to if history is 'append', and users whose content hash did not change are skipped.
+    The IPs of a user are deduplicated and stored as integers with the number of times each one was seen; IPs that
+    are not valid IPv4 addresses are skipped, as in ensure_ip_address_schema.
+    Every batch of batch_size users is written with executemany inside its own transaction, and dates and IPs are
+    linked to the id of the row of their user.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+        users (iterable): The single-key user dictionaries, as yielded by iter_users.
+        batch_size (int, optional): The number of users written per transaction. Defaults to 5000.
+        incremental (bool, optional): Whether to upsert into the existing tables instead of rebuilding them.
+            Defaults to False.
+        history (str, optional): 'replace' or 'append', what to do with the dates and IPs of updated users.
+            Defaults to 'replace'.
+
+    Returns:
+        dict: The number of inserted, updated and skipped users, of inserted dates and IPs (counting repetitions),
+        of skipped invalid IPs, the elapsed seconds and the rows written per second.
+    """
+    if batch_size < 1:
+        raise ValueError("The batch_size parameter must be a positive integer.")
+    if history not in ['replace', 'append']:
+        raise ValueError("The history parameter must be either 'replace' or 'append'.")
+
+    start = time.perf_counter()
+    if not incremental:
+        with conn:
+            conn.execute('DELETE FROM ips')
+            conn.execute('DELETE FROM dates')
+            conn.execute('DELETE FROM users')
+            bump_data_version(conn)
+    ensure_upsert_schema(conn)
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS batch_users (username TEXT PRIMARY KEY)')
+
+    counts = {'users': 0, 'updated': 0, 'skipped': 0, 'dates': 0, 'ips': 0, 'invalid_ips': 0}
+    next_id = (conn.execute('SELECT MAX(id) FROM users').fetchone()[0] or 0) + 1
+    batch = {}
+
+    def flush():
+        nonlocal next_id
+        with conn:
+            conn.execute('DELETE FROM temp.batch_users')
+            conn.executemany('INSERT INTO temp.batch_users (username) VALUES (?)', [(u,) for u in batch])
+            existing = {username: (user_id, stored_hash) for username, user_id, stored_hash in conn.execute(
+                'SELECT u.username, u.id, u.content_hash FROM users u JOIN temp.batch_users b USING (username)')}
+
+            new_rows, updated_rows, replaced_ids, date_rows, ip_rows = [], [], [], [], []
+            for username, (user_info, user_hash) in batch.items():
+                values = (username, user_info['telefono'], user_info['contrasena'], user_info['provincia'],
+                          user_info['permisos'], user_info['emails']['total'], user_info['emails']['phishing'],
+                          user_info['emails']['cliclados'], user_hash)
+                if username in existing:
+                    user_id, stored_hash = existing[username]
+                    if stored_hash == user_hash:
+                        counts['skipped'] += 1
+                        continue
+                    updated_rows.append(values + (user_id,))
+                    if history == 'replace':
+                        replaced_ids.append((user_id,))
+                else:
+                    user_id = next_id
+                    next_id += 1
+                    new_rows.append(values + (user_id,))
+                date_rows.extend((user_id, date, date_to_day(date)) for date in _as_list(user_info['fechas']))
+                addresses = {}
+                for ip in _as_list(user_info['ips']):
+                    address = _ip_to_int_or_none(ip)
+                    if address is None:
+                        counts['invalid_ips'] += 1
+                        continue
+                    addresses[address] = addresses.get(address, 0) + 1
+                ip_rows.extend((user_id, address, occurrences) for address, occurrences in addresses.items())
+                counts['ips'] += sum(addresses.values())
+
+            conn.executemany(INSERT_USER, new_rows)
+            conn.executemany(UPDATE_USER, updated_rows)
+            conn.executemany('DELETE FROM dates WHERE user_id = ?', replaced_ids)
+            conn.executemany('DELETE FROM ips WHERE user_id = ?', replaced_ids)
+            conn.executemany(INSERT_DATE, date_rows)
+            conn.executemany(INSERT_IP, ip_rows)
+            # a batch of unchanged users writes nothing, and keeps the snapshots and the cached results valid
+            if new_rows or updated_rows or replaced_ids:
+                bump_data_version(conn)
+
+        counts['users'] += len(new_rows)
+        counts['updated'] += len(updated_rows)
+        counts['dates'] += len(date_rows)
+        batch.clear()
+
+    for user in users:
+        for username, user_info in user.items():
+            # a username repeated in the same batch keeps its last record
+            batch.pop(username, None)
+            batch[username] = (user_info, content_hash(user_info))
+
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    total_rows = counts['users'] + counts['updated'] + counts['dates'] + counts['ips']
+    counts['seconds'] = elapsed
+    counts['rows_per_second'] = total_rows / elapsed if elapsed > 0 else float('inf')
+    return counts
+
+
+def ingest_sites(conn, sites, batch_size=BATCH_SIZE, incremental=False):
+    """
+    Loads the sites of legal_data_online.json into the database in batches.
+
+    Sites are keyed on their name. A full ingest first empties the sites table, so sites removed from the file are
+    removed from the table too. An incremental ingest keeps the table: new sites are inserted and existing ones are
+    updated.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+        sites (iterable): The single-key site dictionaries, as yielded by iter_sites.
+        batch_size (int, optional): The number of sites written per transaction. Defaults to 5000.
+        incremental (bool, optional): Whether to upsert into the existing table instead of rebuilding it.
+            Defaults to False.
+
+    Returns:
+        int: The number of sites written.
+    """
+    if batch_size < 1:
+        raise ValueError("The batch_size parameter must be a positive integer.")
+
+    if not incremental:
+        with conn:
+            conn.execute('DELETE FROM sites')
+            bump_data_version(conn)
+    count = 0
+    rows = []
+
+    def flush():
+        with conn:
+            # unchanged sites are not updated, and a batch without changes keeps the data version
+            if conn.executemany(UPSERT_SITE, rows).rowcount > 0:
+                bump_data_version(conn)
+
+    for site in sites:
+        for name, info in site.items():
+            outdated = sum(info[policy] == 0 for policy in POLICIES)
+            rows.append((name, info['cookies'], info['aviso'], info['proteccion_de_datos'], info['creacion'], outdated))
+        if len(rows) >= batch_size:
+            flush()
+            count += len(rows)
+            rows.clear()
+    if rows:
+        flush()
+        count += len(rows)
+    return count
+
+
+def ensure_sites_loaded(conn, legal_json_path=LEGAL_JSON_PATH):
+    """
+    Creates the sites table and loads legal_data_online.json into it if it is empty.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+        legal_json_path (str, optional): The path to the legal JSON file. Defaults to LEGAL_JSON_PATH.
+    """
+    create_sites_table(conn)
+    if conn.execute('SELECT 1 FROM sites LIMIT 1').fetchone() is None:
+        ingest_sites(conn, iter_sites(legal_json_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Loads the users and legal JSON exports into the SQLite database.')
+    parser.add_argument('--json', default=USERS_JSON_PATH, help='path to the users JSON file')
+    parser.add_argument('--legal-json', default=LEGAL_JSON_PATH, help='path to the legal JSON file')
+    parser.add_argument('--db', default=db.DATABASE_PATH, help='path to the SQLite database')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='users written per transaction')
+    parser.add_argument('--incremental', action='store_true',
+                        help='upsert users and sites by name instead of rebuilding the tables')
+    parser.add_argument('--history', choices=['replace', 'append'], default='replace',
+                        help='whether the dates and IPs of updated users replace or extend the stored ones')
+    args = parser.parse_args()
+
+    db.set_database_path(args.db)
+    with db.connect() as conn:
+        create_tables(conn)
+        stats = ingest_users(conn, iter_users(args.json), args.batch_size, args.incremental, args.history)
+        num_sites = ingest_sites(conn, iter_sites(args.legal_json), args.batch_size, args.incremental)
+
+    print(f"Inserted {stats['users']} users ({stats['updated']} updated, {stats['skipped']} unchanged), "
+          f"{stats['dates']} dates and {stats['ips']} IPs "
+          f"in {stats['seconds']:.2f} s ({stats['rows_per_second']:.0f} rows/s)")
+    if stats['invalid_ips']:
+        print(f"Skipped {stats['invalid_ips']} invalid IPs")
+    print(f"Loaded {num_sites} sites")
+
+    # the analysis only reads the database, so the passwords are classified as part of the ingest
+    from cracking import get_wordlist_path
+    from useful_functions import classify_passwords
+    wordlist_path = get_wordlist_path()
+    if os.path.exists(wordlist_path):
+        classify_passwords()
+        print(f"Classified the passwords against {wordlist_path}")
+    else:
+        print(f"Skipped the classification of the passwords: {wordlist_path} not found")
+
 
-conn = sqlite3.connect('database.db')
-cursor = conn.cursor()
-
-#creation of database tables
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY,
-        username TEXT,
-        phone TEXT,
-        password_hash TEXT,
-        province TEXT,
-        permissions INTEGER,
-        total_emails INTEGER,
-        phishing_emails INTEGER,
-        clicked_emails INTEGER
-    )
-''')
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS dates (
-        id INTEGER PRIMARY KEY,
-        user_id INTEGER,
-        date TEXT,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-''')
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS ips (
-        id INTEGER PRIMARY KEY,
-        user_id INTEGER,
-        ip TEXT,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-''')
-
-
-conn.commit()
-
-with open('../datos/users_data_online.json') as users_file:
-    users_data = json.load(users_file)
-
-for index, user in enumerate(users_data["usuarios"],start=1):
-    for username, user_info in user.items():
-
-        cursor.execute('''
-            INSERT INTO users (username, phone, password_hash, province, permissions, total_emails, phishing_emails, clicked_emails)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (username, user_info['telefono'], user_info['contrasena'], user_info['provincia'],
-            user_info['permisos'], user_info['emails']['total'], user_info['emails']['phishing'], user_info['emails']['cliclados']))
-
-        for date in user_info['fechas']:
-            cursor.execute('INSERT INTO dates (user_id, date) VALUES (?, ?)',
-                        (index, date))
-
-        for ip in user_info['ips']:
-            cursor.execute('INSERT INTO ips (user_id, ip) VALUES (?, ?)',
-                        (index, ip))
-
-
-conn.commit()
-
-conn.close()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DATABASE_PATH = os.environ.get('PRACTICA_DATABASE', 'database.db')
+POOL_SIZE = 4
+
+# tuned for analytic reads: WAL lets readers run next to the ingest, the rest keeps pages in memory
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA temp_store = MEMORY',
+)
+
+_database_path = DATABASE_PATH
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of SQLite connections to a single database.
+
+    Connections are opened lazily, up to size of them, with the analytic PRAGMAS applied. When every connection is
+    in use, acquire blocks until one is released.
+
+    Args:
+        database_path (str): The path to the SQLite database.
+        size (int, optional): The maximum number of open connections. Defaults to 4.
+    """
+
+    def __init__(self, database_path, size=POOL_SIZE):
+        if size < 1:
+            raise ValueError("The size parameter must be a positive integer.")
+        self.database_path = database_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.database_path, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """
+        Takes a connection from the pool, opening a new one if none is idle and the pool is not full.
+
+        Returns:
+            sqlite3.Connection: A connection for the exclusive use of the caller until it is released.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get()
+
+    def release(self, conn):
+        """
+        Gives a connection back to the pool, rolling back any transaction left open.
+
+        Args:
+            conn (sqlite3.Connection): A connection obtained from acquire.
+        """
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that acquires a connection and releases it on exit.
+
+        Yields:
+            sqlite3.Connection: The acquired connection.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """
+        Closes the idle connections of the pool.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+def get_database_path():
+    """
+    Returns the path of the database used by default, taken from the PRACTICA_DATABASE environment variable
+    or 'database.db'.
+
+    Returns:
+        str: The path to the SQLite database.
+    """
+    return _database_path
+
+
+def set_database_path(database_path):
+    """
+    Changes the database used by default by connect and every helper function.
+
+    Args:
+        database_path (str): The path to the SQLite database.
+    """
+    global _database_path
+    _database_path = database_path
+
+
+def get_pool(database_path=None):
+    """
+    Returns the connection pool of a database, creating it on first use.
+
+    Pools are kept per process, so workers forked from a process with open connections get their own.
+
+    Args:
+        database_path (str, optional): The path to the SQLite database. Defaults to get_database_path().
+
+    Returns:
+        ConnectionPool: The pool of the database.
+    """
+    key = (os.getpid(), os.path.abspath(database_path or _database_path))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key[1])
+    return pool
+
+
+@contextmanager
+def connect(database_path=None):
+    """
+    Context manager that borrows a pooled connection to a database.
+
+    Args:
+        database_path (str, optional): The path to the SQLite database. Defaults to get_database_path().
+
+    Yields:
+        sqlite3.Connection: The borrowed connection.
+    """
+    with get_pool(database_path).connection() as conn:
+        yield conn
+
+
+def close_pools():
+    """
+    Closes the idle connections of every pool of the current process.
+    """
+    with _pools_lock:
+        pools = [pool for (pid, path), pool in _pools.items() if pid == os.getpid()]
+    for pool in pools:
+        pool.close()
@@ -1,20 +1,31 @@
-import sqlite3
+import argparse
+import functools
 import json
-import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime
-import numpy as np
-import hashlib
-
-def get_users_by_permission_type(permission_type: int):
+from useful_functions import classify_passwords, prepare_database
+from create_database import PHISHING_PROBABILITY, USER_COLUMNS, date_to_day
+import db
+from instrument import instrumented
+from memo import memoize
+from pipeline import Stage, run_pipeline
+from rendering import (FORMATS, SUPPORTED_FORMATS, outdated_policies_aggregates, render_charts, save_chart, show_chart,
+                       sites_by_year_aggregates)
+from site_compliance import POLICIES, SiteCompliance
+from snapshots import load_table
+
+DATE_FORMAT = "%d/%m/%Y"
+
+@instrumented()
+@memoize()
+def get_users_by_permission_type(permission_type: int, columns=None):
     """
     Fetches users from the database based on their permission type.
 
-    This function connects to a SQLite database, executes a SQL query to fetch users based on their permission type,
-    and returns the result as a pandas DataFrame.
+    This function loads the users with the given permission type, from the Parquet snapshot of the users table
+    when it is up to date or from the SQLite database otherwise, and returns the result as a pandas DataFrame.
 
     Args:
         permission_type (int): The permission type of the users to fetch. Must be either 0 or 1.
+        columns (list, optional): The columns to fetch. Defaults to every column.
 
     Returns:
         pandas.DataFrame: A DataFrame containing the fetched users.
@@ -24,44 +35,56 @@ def get_users_by_permission_type(permission_type: int):
     """
     if permission_type not in [0, 1]:
         raise ValueError("The permission_type parameter must be either 0 or 1.")
-    with sqlite3.connect('database.db') as conn:
-        query = "SELECT * FROM users WHERE permissions=?"
-        users_df = pd.read_sql_query(query, conn, params=(permission_type,))
-    return users_df
+    return load_table('users', columns, [('permissions', permission_type)])
 
 
+@instrumented()
+@memoize()
 def get_dates_from_database():
     """
     Fetches dates from the database.
 
-    This function connects to a SQLite database, executes a SQL query to fetch all dates,
-    and returns the result as a pandas DataFrame.
+    This function loads all dates, from the Parquet snapshot of the dates table when it is up to date or from the
+    SQLite database otherwise, and returns the result as a pandas DataFrame. The 'day' column is parsed from the
+    dates if the database lacks it.
 
     Returns:
         pandas.DataFrame: A DataFrame containing the fetched dates.
     """
-    conn = sqlite3.connect('database.db')
-    dates_df = pd.read_sql_query("SELECT * FROM dates", conn)
-    conn.close()
-    return dates_df
+    dates_df = load_table('dates')
+    if 'day' in dates_df and dates_df['day'].notna().all():
+        return dates_df
+    return add_day_column(dates_df)
 
 
+@instrumented()
+def add_day_column(dates_df):
+    """
+    Parses the 'date' column of a DataFrame into an integer 'day' column.
+
+    The dates, stored as day/month/year strings, are parsed once and converted to the number of days since
+    1970-01-01, so they can be sorted and subtracted as plain integers.
 
+    Args:
+        dates_df (pandas.DataFrame): A DataFrame with a 'date' column.
 
-def calculate_average_date_difference(date_list):
-    date_format = "%d/%m/%Y"
-    sorted_dates = sorted(date_list, key=lambda x: datetime.strptime(x, date_format))
-    differences = [(datetime.strptime(sorted_dates[i+1], date_format) - datetime.strptime(sorted_dates[i], date_format)).days for i in range(len(sorted_dates) - 1)]
-    return round(sum(differences) / len(differences)) if differences else 0
+    Returns:
+        pandas.DataFrame: The same DataFrame with the 'day' column added.
+    """
+    import pandas as pd
+    dates = pd.to_datetime(dates_df['date'], format=DATE_FORMAT)
+    dates_df['day'] = (dates - pd.Timestamp(0)).dt.days
+    return dates_df
 
 
+@instrumented()
 def get_user_dates_dict(dates_df):
     """
     Creates a dictionary of users and their corresponding date differences.
 
-    This function groups the DataFrame by the 'user_id' column and applies the list function to the 'date' column.
-    It then calculates the average date difference for each user and returns a dictionary where the keys are the user IDs
-    and the values are the average date differences.
+    The average difference between consecutive sorted dates of a user is the span between its first and last date
+    divided by the number of intervals, so it is computed with a single groupby over the 'day' column. Users with a
+    single date get 0.
 
     Args:
         dates_df (pandas.DataFrame): A DataFrame containing the dates associated with each user.
@@ -69,23 +92,138 @@ def get_user_dates_dict(dates_df):
     Returns:
         dict: A dictionary where the keys are the user IDs and the values are the average date differences.
     """
-    user_dates_dict = dates_df.groupby('user_id')['date'].apply(list).to_dict()
-    return {user_id: calculate_average_date_difference(dates) for user_id, dates in user_dates_dict.items()}
+    if 'day' not in dates_df:
+        dates_df = add_day_column(dates_df.copy())
+    spans = dates_df.groupby('user_id')['day'].agg(['min', 'max', 'count'])
+    averages = (spans['max'] - spans['min']) / (spans['count'] - 1)
+    return averages.round().fillna(0).astype(int).to_dict()
 
 
-def probability_of_phishing_emails():
-    conn = sqlite3.connect('database.db')
-    users = pd.read_sql_query("SELECT * FROM users", conn)
-    users_prob = pd.DataFrame(columns=['id', 'probability'])
-    for i, user in users.iterrows():
-        if user['phishing_emails'] != 0:
-            phishing_prob = user['clicked_emails'] / user['phishing_emails']
-        else:
-            phishing_prob = 0
-        users_prob = users_prob._append({'id': user['id'], 'probability': phishing_prob}, ignore_index=True)
+@instrumented()
+@memoize()
+def get_user_intervals():
+    """
+    Computes the average password change interval of every user inside the database.
+
+    The (user_id, day) index covers the aggregation, so the dates table is never loaded into memory.
+    The result is the same as get_user_dates_dict(get_dates_from_database()).
+
+    Returns:
+        dict: A dictionary where the keys are the user IDs and the values are the average date differences.
+    """
+    with db.connect() as conn:
+        cursor = conn.execute("""
+            SELECT user_id, CAST(MAX(day) - MIN(day) AS REAL) / (COUNT(*) - 1)
+            FROM dates
+            GROUP BY user_id
+        """)
+        intervals = {user_id: round(average) if average is not None else 0 for user_id, average in cursor}
+    return intervals
+
+
+@instrumented()
+@memoize()
+def get_password_change_intervals():
+    """
+    Computes the average password change interval of the admin users and of the normal users.
+
+    Users with a single password change count as an interval of 0.
+
+    Returns:
+        tuple: The average interval, in days, of the admin users and of the normal users.
+    """
+    import pandas as pd
+
+    user_dates_dict = get_user_intervals()
+
+    admin_users_df = get_users_by_permission_type(1, columns=['id'])
+    normal_users_df = get_users_by_permission_type(0, columns=['id'])
+
+    admin_dates_df = pd.DataFrame(
+        {'id': admin_users_df['id'], 'date': admin_users_df['id'].map(user_dates_dict).fillna(0)})
+    normal_dates_df = pd.DataFrame(
+        {'id': normal_users_df['id'], 'date': normal_users_df['id'].map(user_dates_dict).fillna(0)})
+
+    admin_interval = admin_dates_df['date'].mean()
+    normal_interval = normal_dates_df['date'].mean()
+    return admin_interval, normal_interval
+
+
+@instrumented()
+def get_user_date_history(user_id):
+    """
+    Fetches the password change dates of a user in chronological order.
+
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the 'date' and 'day' of every password change of the user.
+    """
+    import pandas as pd
+    with db.connect() as conn:
+        query = "SELECT date, day FROM dates WHERE user_id = ? ORDER BY day"
+        history_df = pd.read_sql_query(query, conn, params=(user_id,))
+    return history_df
+
+
+@instrumented()
+def get_dates_in_range(start_date, end_date):
+    """
+    Fetches the password changes that happened between two dates, both included.
+
+    Args:
+        start_date (str): The first date of the range, formatted as %d/%m/%Y.
+        end_date (str): The last date of the range, formatted as %d/%m/%Y.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the matching rows of the dates table, sorted by date.
+    """
+    import pandas as pd
+    with db.connect() as conn:
+        query = "SELECT * FROM dates WHERE day BETWEEN ? AND ? ORDER BY day"
+        dates_df = pd.read_sql_query(query, conn, params=(date_to_day(start_date), date_to_day(end_date)))
+    return dates_df
+
+
+PHISHING_PROBABILITY_QUERY = f"""
+    SELECT id, {PHISHING_PROBABILITY} AS probability
+    FROM users
+"""
+
+
+def _read_query_chunks(query, chunksize):
+    import pandas as pd
+    with db.connect() as conn:
+        yield from pd.read_sql_query(query, conn, chunksize=chunksize)
+
+
+@instrumented()
+@memoize()
+def probability_of_phishing_emails(chunksize=None):
+    """
+    Computes the probability of each user clicking on a phishing email.
+
+    The probability is the ratio of clicked to received phishing emails, computed by SQLite in a single query.
+    Users that received no phishing emails get a probability of 0.
+
+    Args:
+        chunksize (int, optional): If given, the users are streamed in DataFrames of at most chunksize rows
+            instead of being loaded at once. Defaults to None.
+
+    Returns:
+        pandas.DataFrame or iterator: A DataFrame with the 'id' and 'probability' of every user, or an iterator of
+        such DataFrames if chunksize is given.
+    """
+    import pandas as pd
+    if chunksize is not None:
+        return _read_query_chunks(PHISHING_PROBABILITY_QUERY, chunksize)
+    with db.connect() as conn:
+        users_prob = pd.read_sql_query(PHISHING_PROBABILITY_QUERY, conn)
     return users_prob
 
 
+@instrumented()
 def load_data(file_path):
     """
     This function loads data from a JSON file.
@@ -101,240 +239,374 @@ def load_data(file_path):
     return data
 
 
+def get_site_compliance(data):
+    """
+    Returns the compliance store of the sites, building it only if needed.
+
+    Args:
+        data (dict, list or SiteCompliance): The data containing the site information, a list of single-key site
+            dictionaries or an already built store.
+
+    Returns:
+        SiteCompliance: The store of the sites.
+    """
+    if isinstance(data, SiteCompliance):
+        return data
+    if isinstance(data, dict):
+        return SiteCompliance.from_data(data)
+    return SiteCompliance.from_entries(data)
+
+
 def get_worst_sites(data, num_sites=5):
     """
     Returns the worst sites based on their legal compliance.
 
-    This function sorts the sites in the 'legal' section of the data based on the sum of their non-compliant attributes.
-    It then returns the specified number of worst sites.
+    This function ranks the sites based on the number of their outdated policies and returns the specified number
+    of worst sites, from the least to the most outdated.
 
     Args:
-        data (dict): The data containing the site information.
+        data (dict or SiteCompliance): The data containing the site information.
         num_sites (int, optional): The number of worst sites to return. Defaults to 5.
 
     Returns:
         list: A list of the worst sites based on their legal compliance.
     """
-    return sorted(data["legal"], key=lambda x: sum(value == 0 for value in list(x.values())[0]))[-num_sites:]
+    return get_site_compliance(data).worst_sites(num_sites)
+
 
+def _show_or_save(kind, data, output_dir, formats):
+    if output_dir is None:
+        show_chart(kind, data)
+        return None
+    return save_chart(kind, data, output_dir, formats)
 
-def plot_password_change_intervals(admin_interval, normal_interval):
+
+@instrumented()
+def plot_password_change_intervals(admin_interval, normal_interval, output_dir=None, formats=FORMATS):
     """
     Plots the average password change intervals for admin and normal users.
 
     Args:
         admin_interval (float): The average password change interval for admin users.
         normal_interval (float): The average password change interval for normal users.
-    """
-    labels = ['Admin', 'Normal']
-    intervals = [admin_interval, normal_interval]
+        output_dir (str, optional): The directory the chart is written to, without a display. Defaults to
+            None, which shows it in a pyplot window.
+        formats (iterable, optional): The file formats written to output_dir, among 'png' and 'svg'.
+            Defaults to ('png',).
 
-    plt.figure(figsize=(8, 6))
-    plt.bar(labels, intervals, color=['blue', 'orange'])
-    plt.xlabel('Tipo de usuario')
-    plt.ylabel('Intervalo medio de cambio de contraseña')
-    plt.title('Intervalo medio de cambio de contraseña para usuarios Admin y Normal')
-    plt.show()
+    Returns:
+        list: The paths of the written files, or None when the chart is shown.
+    """
+    return _show_or_save('password_change_intervals',
+                         {'admin_interval': admin_interval, 'normal_interval': normal_interval}, output_dir, formats)
 
 def get_sites_with_outdated_policies(data):
     """
     Returns a dictionary of sites and their outdated policies.
 
     Args:
-        data (dict): The data containing the site information.
+        data (dict or SiteCompliance): The data containing the site information. It is not modified.
 
     Returns:
         dict: A dictionary where the keys are the site names and the values are dictionaries of outdated policies.
     """
-    outdated_policies_count = {}
-    for site_entry in data["legal"]:
-        site_name, site_data = site_entry.popitem()
-        outdated_policies_count[site_name] = {policy: value == 0 for policy, value in site_data.items() if
-                                              policy in ['cookies', 'aviso', 'proteccion_de_datos']}
-    return outdated_policies_count
+    sites = get_site_compliance(data)
+    return {site: sites.outdated_policies(index) for index, site in enumerate(sites.names)}
 
 
-def plot_sites_with_most_outdated_policies(data, num_sites=5):
+def plot_sites_with_most_outdated_policies(data, num_sites=5, output_dir=None, formats=FORMATS):
     """
     Plots the top 5 sites with the most outdated policies.
 
     Args:
-        data (dict): The data containing the site information.
+        data (dict or SiteCompliance): The data containing the site information.
         num_sites (int, optional): The number of sites to plot. Defaults to 5.
+        output_dir (str, optional): The directory the chart is written to, without a display. Defaults to
+            None, which shows it in a pyplot window.
+        formats (iterable, optional): The file formats written to output_dir, among 'png' and 'svg'.
+            Defaults to ('png',).
+
+    Returns:
+        list: The paths of the written files, or None when the chart is shown.
+    """
+    return plot_outdated_policies(get_site_compliance(data).most_outdated(num_sites), output_dir, formats)
+
+
+@instrumented()
+def plot_outdated_policies(worst_sites, output_dir=None, formats=FORMATS):
+    """
+    Plots the outdated policies of the given sites.
+
+    Args:
+        worst_sites (list): A list of (site name, outdated policies) tuples, as returned by get_most_outdated_sites.
+        output_dir (str, optional): The directory the chart is written to, without a display. Defaults to
+            None, which shows it in a pyplot window.
+        formats (iterable, optional): The file formats written to output_dir, among 'png' and 'svg'.
+            Defaults to ('png',).
+
+    Returns:
+        list: The paths of the written files, or None when the chart is shown.
     """
-    outdated_policies_count = get_sites_with_outdated_policies(data)
-    sorted_sites = sorted(outdated_policies_count.items(), key=lambda x: sum(x[1].values()), reverse=True)
-    worst_sites = sorted_sites[:num_sites]
+    return _show_or_save('outdated_policies', outdated_policies_aggregates(worst_sites), output_dir, formats)
 
-    sites, policy_counts = zip(*worst_sites)
-    cookies, avisos, proteccion_de_datos = zip(*[list(site_policy.values()) for site_policy in policy_counts])
+@instrumented()
+def get_most_outdated_sites(num_sites=5):
+    """
+    Fetches the sites with the most outdated policies from the database.
 
-    bar_width = 0.3
-    r1 = np.arange(len(sites))
-    r2 = [x + bar_width for x in r1]
-    r3 = [x + bar_width for x in r2]
+    The ranking runs in SQLite over the index on the number of outdated policies; ties keep the order of the data.
 
-    plt.figure(figsize=(10, 6))
-    plt.barh(r1, cookies, color='red', height=bar_width, edgecolor='grey', label='Cookies desactualizados')
-    plt.barh(r2, avisos, color='green', height=bar_width, edgecolor='grey', label='Avisos desactualizados')
-    plt.barh(r3, proteccion_de_datos, color='blue', height=bar_width, edgecolor='grey',
-             label='Proteccion de Datos desactualizados')
+    Args:
+        num_sites (int, optional): The number of sites to return. Defaults to 5.
+
+    Returns:
+        list: A list of (site name, outdated policies) tuples, from the most to the least outdated.
+    """
+    with db.connect() as conn:
+        cursor = conn.execute(f"""
+            SELECT name, {', '.join(POLICIES)}
+            FROM sites
+            ORDER BY outdated_policies DESC, id
+            LIMIT ?
+        """, (num_sites,))
+        return [(name, {policy: value == 0 for policy, value in zip(POLICIES, values)})
+                for name, *values in cursor]
+
+
+@instrumented()
+def get_sites_by_year(respecting):
+    """
+    Fetches the names of the sites that respect (or do not respect) every privacy policy, grouped by creation year.
+
+    Args:
+        respecting (bool): True for the sites with every policy up to date, False for the rest.
 
-    plt.ylabel('Nombre del sitio web')
-    plt.xlabel('Número de políticas desactualizadas')
-    plt.title('Top 5 sitios web con más políticas desactualizadas')
-    plt.yticks([r + bar_width for r in range(len(cookies))], sites)
-    plt.gca().invert_yaxis()
-    plt.legend()
+    Returns:
+        dict: A dictionary where the keys are the creation years, in ascending order, and the values are lists of
+        the names of the sites created in those years.
+    """
+    condition = ' AND '.join(f'{policy} = 1' for policy in POLICIES)
+    if not respecting:
+        condition = f'NOT ({condition})'
+    sites_by_year = {}
+    with db.connect() as conn:
+        cursor = conn.execute(f"SELECT creation_year, name FROM sites WHERE {condition} ORDER BY creation_year, id")
+        for year, name in cursor:
+            sites_by_year.setdefault(year, []).append(name)
+    return sites_by_year
 
-    plt.show()
 
 def respects_policies(data):
     """
     Returns two lists of sites that respect and do not respect privacy policies.
 
     Args:
-        data (dict): The data containing the site information.
+        data (dict or SiteCompliance): The data containing the site information.
 
     Returns:
         tuple: A tuple containing two lists. The first list contains the sites that respect privacy policies.
         The second list contains the sites that do not respect privacy policies.
     """
-    respecting_sites = []
-    non_respecting_sites = []
-    for site_info in data['legal']:
-        for site, info in site_info.items():
-            if info["cookies"] == 1 and info["aviso"] == 1 and info["proteccion_de_datos"] == 1:
-
-                respecting_sites.append(site_info)
-            else:
-
-                non_respecting_sites.append(site_info)
-
-    return respecting_sites, non_respecting_sites
+    sites = get_site_compliance(data)
+    respecting, non_respecting = sites.split_by_respect()
+    return [sites.entries[i] for i in respecting], [sites.entries[i] for i in non_respecting]
 
 def group_by_creation_year(data):
     """
     Groups sites by their creation year.
 
     Args:
-        data (list): A list of dictionaries where each dictionary represents a site.
+        data (list or SiteCompliance): A list of dictionaries where each dictionary represents a site.
 
     Returns:
         dict: A dictionary where the keys are the creation years and the values are lists of sites created in those years.
     """
-    sites_by_year = {}
-    for entry in data:
-        for site, info in entry.items():
-            year = info['creacion']
-            if year not in sites_by_year:
-                sites_by_year[year] = []
-            sites_by_year[year].append(site)
-
-    sites_by_year = {year: sites for year, sites in sorted(sites_by_year.items(), key=lambda item: int(item[0]))}
-
-    return sites_by_year
+    return get_site_compliance(data).group_by_year()
 
 
-def plot_data(sites_by_year):
+@instrumented()
+def plot_data(sites_by_year, output_dir=None, formats=FORMATS):
     """
     Plots the number of sites by their creation year.
 
     Args:
         sites_by_year (dict): A dictionary where the keys are the creation years and the values are lists of sites created in those years.
-    """
-    years = list(sites_by_year.keys())
-    years.sort()
+        output_dir (str, optional): The directory the chart is written to, without a display. Defaults to
+            None, which shows it in a pyplot window.
+        formats (iterable, optional): The file formats written to output_dir, among 'png' and 'svg'.
+            Defaults to ('png',).
 
-    sites_counts = [len(sites_by_year[year]) for year in years]
+    Returns:
+        list: The paths of the written files, or None when the chart is shown.
+    """
+    return _show_or_save('sites_by_year', sites_by_year_aggregates(sites_by_year), output_dir, formats)
 
-    plt.figure(figsize=(10, 6))
-    plt.bar(years, sites_counts, color='b')
-    plt.xlabel('Year of Creation')
-    plt.ylabel('Number of Sites')
-    plt.title('Number of Sites by Year of Creation')
-    plt.show()
+@instrumented()
+@memoize()
+def get_users_with_weak_passwords_and_probability(num_users=10):
+    """
+    Returns the users with weak passwords that are the most likely to click on a phishing email.
 
-def get_weak_passwords():
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
+    The users are ranked by get_critical_users, so the passwords must have been classified.
 
-    cursor.execute('SELECT DISTINCT password_hash FROM users')
-    password_hashes = cursor.fetchall()
-    hashed_passwords = [password_hash[0] for password_hash in password_hashes]
-    weak_passwords = []
+    Args:
+        num_users (int, optional): The number of users to return. Defaults to 10. With None, every user with a
+            weak password is returned.
 
-    with open("rockyou.txt", "r", encoding="latin-1") as dic_file:
-        for mot in dic_file:
-            mot = mot.strip()
-            hachage_md5 = hashlib.md5(mot.encode()).hexdigest()
-            if hachage_md5 in hashed_passwords and not hachage_md5 in weak_passwords:
-                weak_passwords.append(hachage_md5)
+    Returns:
+        pandas.DataFrame: The users, with their 'probability', from the most to the least likely.
+    """
+    return get_critical_users(num_users)
 
-    conn.close()
-    return weak_passwords
 
-def get_users_with_weak_passwords_and_probability():
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
+@instrumented()
+def get_critical_users(num_users=10, offset=0, columns=None):
+    """
+    Ranks the users with weak passwords by their probability of clicking on a phishing email, in SQLite.
 
-    weak_passwords = get_weak_passwords()
-    weak_passwords_str = ','.join(['"{}"'.format(mdp) for mdp in weak_passwords])
-    query = f"SELECT * FROM users WHERE password_hash IN ({weak_passwords_str})"
-    users_df = pd.read_sql_query(query, conn)
-    conn.close()
+    The probability is computed as in probability_of_phishing_emails, so users that received no phishing emails
+    get 0 instead of a division by zero. The ranking is read in order from the index on the weak_password flag and
+    the probability, so only the returned users are loaded. Ties keep the order of the ids. The passwords must
+    have been classified with classify_passwords, which the ingest and prepare_database do.
 
-    users_df['probability'] = users_df['clicked_emails'] / users_df['phishing_emails']
+    Args:
+        num_users (int, optional): The number of users to return. Defaults to 10. With None, every user with a
+            weak password is returned.
+        offset (int, optional): The number of users of the ranking to skip first. Defaults to 0.
+        columns (list, optional): The columns of the users table to return. Defaults to create_database.USER_COLUMNS,
+            the columns of the users export.
 
-    users_df = users_df.nlargest(10, 'probability')
+    Returns:
+        pandas.DataFrame: The users, with their 'probability', from the most to the least likely.
+    """
+    import pandas as pd
+
+    query = f"""
+        SELECT {', '.join(columns or USER_COLUMNS)}, {PHISHING_PROBABILITY} AS probability
+        FROM users
+        WHERE weak_password = 1
+        ORDER BY {PHISHING_PROBABILITY} DESC, id
+        LIMIT ? OFFSET ?
+    """
+    with db.connect() as conn:
+        users_df = pd.read_sql_query(query, conn, params=(-1 if num_users is None else num_users, offset))
     return users_df
-def main():
-    data = load_data("../datos/legal_data_online.json")
-    dates_df = get_dates_from_database()
 
-    user_dates_dict = get_user_dates_dict(dates_df)
 
-    admin_users_df = get_users_by_permission_type(1)
-    normal_users_df = get_users_by_permission_type(0)
+def count_critical_users():
+    """
+    Returns the number of users with weak passwords, as ranked by get_critical_users.
+    """
+    with db.connect() as conn:
+        return conn.execute('SELECT COUNT(*) FROM users WHERE weak_password = 1').fetchone()[0]
 
-    admin_dates_df = pd.DataFrame(
-        {'id': admin_users_df['id'], 'date': admin_users_df['id'].map(user_dates_dict).fillna(0)})
-    normal_dates_df = pd.DataFrame(
-        {'id': normal_users_df['id'], 'date': normal_users_df['id'].map(user_dates_dict).fillna(0)})
 
-    admin_interval = admin_dates_df['date'].mean()
-    normal_interval = normal_dates_df['date'].mean()
+def _get_sites_report():
+    return {
+        'most_outdated': get_most_outdated_sites(5),
+        'respecting': get_sites_by_year(respecting=True),
+        'non_respecting': get_sites_by_year(respecting=False),
+    }
 
-    df = pd.DataFrame({'Tipo': ['Admin', 'Normal'],
-                       'Intervalo medio de cambio de contraseña': [admin_interval, normal_interval]})
 
-    print(df)
+def _get_critical_users(classified):
+    return get_critical_users()
+
+
+def _render_report_charts(intervals, sites, output_dir, formats, workers):
+    admin_interval, normal_interval = intervals
+    charts = [
+        ('password_change_intervals', {'admin_interval': admin_interval, 'normal_interval': normal_interval}),
+        ('outdated_policies', outdated_policies_aggregates(sites['most_outdated'])),
+    ]
+    return render_charts(charts, output_dir, formats, workers)
 
-    plot_password_change_intervals(admin_interval, normal_interval)
 
-    phishing_probabilities = probability_of_phishing_emails()
-    top_10_critical_users = phishing_probabilities.nlargest(10, 'probability')
+def report_stages(output_dir=None, formats=FORMATS, workers=None):
+    """
+    Returns the stages of the report as a dependency graph.
+
+    The password change intervals, the site rankings and the classification of the passwords are independent. The
+    classification, the slowest of them, runs in its own process, and only the critical users wait for it. When
+    output_dir is given, the charts are rendered as soon as their data is ready.
+
+    Args:
+        output_dir (str, optional): The directory the charts are written to. Defaults to None, which leaves the
+            charts to be shown once the report is assembled.
+        formats (iterable, optional): The file formats written to output_dir. Defaults to ('png',).
+        workers (int, optional): The number of processes rendering the charts.
+
+    Returns:
+        list: The pipeline.Stage objects of the report.
+    """
+    stages = [
+        Stage('intervals', get_password_change_intervals),
+        Stage('sites', _get_sites_report),
+        Stage('classify', classify_passwords, in_process=True),
+        Stage('critical_users', _get_critical_users, ('classify',)),
+    ]
+    if output_dir is not None:
+        stages.append(Stage('charts', functools.partial(_render_report_charts, output_dir=output_dir,
+                                                        formats=formats, workers=workers),
+                            ('intervals', 'sites')))
+    return stages
+
+
+@instrumented()
+def run_report(output_dir=None, formats=FORMATS, workers=None):
+    """
+    Prints the analysis of the password change intervals, the critical users and the privacy policies of the
+    sites, and plots its charts.
+
+    The independent parts of the analysis run concurrently through report_stages, and the report is printed once
+    they are all assembled.
 
-    conn = sqlite3.connect('database.db')
-    users_df = pd.read_sql_query("SELECT * FROM users", conn)
+    Args:
+        output_dir (str, optional): The directory the charts are written to, without a display. Defaults to None,
+            which shows each chart in a pyplot window.
+        formats (iterable, optional): The file formats written to output_dir, among 'png' and 'svg'.
+            Defaults to ('png',).
+        workers (int, optional): The number of processes rendering the charts written to output_dir.
+
+    Returns:
+        dict: The result of every stage of the report.
+    """
+    import pandas as pd
+
+    prepare_database(classify=False)
+    report = run_pipeline(report_stages(output_dir, formats, workers))
 
-    merged_df = pd.merge(users_df, phishing_probabilities, on='id', how='left')
+    admin_interval, normal_interval = report['intervals']
+    df = pd.DataFrame({'Tipo': ['Admin', 'Normal'],
+                       'Intervalo medio de cambio de contraseña': [admin_interval, normal_interval]})
+
+    print(df)
 
-    plot_sites_with_most_outdated_policies(data)
+    if output_dir is None:
+        plot_password_change_intervals(admin_interval, normal_interval)
+        plot_outdated_policies(report['sites']['most_outdated'])
 
-    data = load_data("../datos/legal_data_online.json")
+    print("Sites respecting privacy", report['sites']['respecting'])
 
-    respect, non_respect =respects_policies(data)
+    print("Sites not respecting privacy", report['sites']['non_respecting'])
 
-    sites_by_year = group_by_creation_year(respect)
+    print(report['critical_users'])
 
-    print("Sites respecting privacy",sites_by_year)
+    for paths in report.get('charts', {}).values():
+        print("Chart written to", ', '.join(paths))
+    return report
 
-    sites_by_year = group_by_creation_year(non_respect)
 
-    print("Sites not respecting privacy",sites_by_year)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyses the password change intervals, the critical users and the '
+                                                 'privacy policies of the sites.')
+    parser.add_argument('--output-dir', help='write the charts to this directory instead of showing them')
+    parser.add_argument('--format', dest='formats', action='append', choices=SUPPORTED_FORMATS,
+                        help='file format of the written charts, may be repeated (default: png)')
+    parser.add_argument('--workers', type=int, help='number of processes rendering the charts')
+    args = parser.parse_args(argv)
+    run_report(args.output_dir, args.formats or FORMATS, args.workers)
 
-    print(get_users_with_weak_passwords_and_probability())
 
 if __name__ == "__main__":
     main()
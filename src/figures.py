@@ -0,0 +1,147 @@
+import gzip
+import importlib.util
+import threading
+from dataclasses import dataclass
+
+import analytics
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+_figures = {}
+_build_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class EncodedFigure:
+    """
+    A Plotly figure serialized as JSON for a version of the data, with its precompressed variants.
+
+    The encodings map a content coding ('identity', 'gzip' and, with the brotli package, 'br') to the bytes of the
+    figure in that coding.
+    """
+    version: str
+    encodings: dict
+
+    def preferred_encodings(self):
+        """
+        Returns the available content codings, from the smallest to the largest.
+        """
+        return [encoding for encoding in ('br', 'gzip', 'identity') if encoding in self.encodings]
+
+
+def brotli_available():
+    """
+    Returns whether the brotli package, needed for the 'br' variant of the figures, is installed.
+    """
+    return importlib.util.find_spec('brotli') is not None
+
+
+def compress_variants(body):
+    """
+    Compresses a response body once with every supported content coding.
+
+    Args:
+        body (bytes): The uncompressed body.
+
+    Returns:
+        dict: A dictionary mapping every content coding, 'identity' included, to the encoded body.
+    """
+    # a fixed mtime keeps the gzip bytes identical across builds of the same figure
+    encodings = {'identity': body, 'gzip': gzip.compress(body, GZIP_LEVEL, mtime=0)}
+    if brotli_available():
+        import brotli
+        encodings['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return encodings
+
+
+def password_intervals_figure():
+    """
+    Builds the bar chart of the average password change interval of admin and normal users.
+    """
+    import plotly.graph_objects as go
+
+    intervals = analytics.password_change_intervals()
+    return go.Figure(
+        data=[go.Bar(x=['Admin', 'Normal'], y=[intervals['admin'], intervals['normal']],
+                     marker_color=['blue', 'orange'])],
+        layout_title_text='Intervalo medio de cambio de contraseña para usuarios Admin y Normal',
+        layout_xaxis_title_text='Tipo de usuario',
+        layout_yaxis_title_text='Intervalo medio de cambio de contraseña',
+    )
+
+
+def worst_sites_figure():
+    """
+    Builds the bar chart of the outdated policies of the 5 sites with the most outdated policies.
+    """
+    import plotly.graph_objects as go
+    from site_compliance import POLICIES
+
+    sites = analytics.worst_sites(5)
+    names = [site['name'] for site in sites]
+    return go.Figure(
+        data=[go.Bar(name=policy, y=names, x=[int(policy in site['outdated_policies']) for site in sites],
+                     orientation='h')
+              for policy in POLICIES],
+        layout_title_text='Top 5 sitios web con más políticas desactualizadas',
+        layout_xaxis_title_text='Número de políticas desactualizadas',
+        layout_yaxis_autorange='reversed',
+    )
+
+
+def cohorts_figure():
+    """
+    Builds the bar chart of the average phishing emails of every cohort of users.
+    """
+    import plotly.graph_objects as go
+
+    stats = analytics.cohort_stats()
+    return go.Figure(
+        data=[go.Bar(x=[cohort['cohort'] for cohort in stats], y=[cohort['mean'] for cohort in stats])],
+        layout_title_text='Average of phishing emails by cohort',
+    )
+
+
+# figure name -> function building the Plotly figure
+FIGURES = {
+    'password_intervals': password_intervals_figure,
+    'worst_sites': worst_sites_figure,
+    'cohorts': cohorts_figure,
+}
+
+
+def get_figure(name):
+    """
+    Returns a figure of the registry, building and encoding it only once per version of the data.
+
+    Args:
+        name (str): The name of the figure, one of FIGURES.
+
+    Returns:
+        EncodedFigure: The JSON of the figure in every content coding.
+
+    Raises:
+        KeyError: If the figure is not in the registry.
+    """
+    builder = FIGURES[name]
+    version = analytics.data_version()
+    entry = _figures.get(name)
+    if entry is not None and entry.version == version:
+        return entry
+
+    with _build_lock:
+        version = analytics.data_version()
+        entry = _figures.get(name)
+        if entry is not None and entry.version == version:
+            return entry
+        entry = EncodedFigure(version, compress_variants(builder().to_json().encode()))
+        _figures[name] = entry
+    return entry
+
+
+def clear_figures():
+    """
+    Drops every encoded figure of the current process.
+    """
+    _figures.clear()
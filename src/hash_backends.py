@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import re
+from dataclasses import dataclass
+
+PBKDF2_DIGEST_SIZE = 32
+# number of candidate passwords hashed at once: large for the fast digests, small for the key derivation functions, so
+# that the search of a hash stops soon after it is found
+BATCH_SIZE = 50000
+PBKDF2_BATCH_SIZE = 8
+
+HEX_DIGEST = re.compile(r'[0-9a-fA-F]+')
+# <algorithm>$<salt>$<hex digest>, the salted formats of Django and other legacy exports
+SALTED_HEX = re.compile(r'(md5|sha1|sha256)\$([^$]*)\$([0-9a-fA-F]+)')
+# pbkdf2_sha256$<iterations>$<salt>$<base64 digest>, the default format of Django
+PBKDF2_SHA256 = re.compile(r'pbkdf2_sha256\$(\d+)\$([^$]+)\$([A-Za-z0-9+/]+={0,2})')
+
+
+@dataclass(frozen=True)
+class ParsedHash:
+    """
+    A stored password hash split into the parts its backend needs to check a candidate password.
+
+    The digest is normalized to the form hash_batch returns, so a password matches when the digest of the password
+    equals it. salt and iterations are only set for the salted formats.
+    """
+    backend: str
+    digest: str
+    salt: str = None
+    iterations: int = None
+
+
+@dataclass(frozen=True)
+class HashBackend:
+    """
+    A hash format of the stored passwords.
+
+    parse takes a stored hash and returns its ParsedHash, or None if it is not in this format. hash_batch takes a list
+    of candidate passwords and the ParsedHash they are checked against (only used by the salted backends) and
+    returns the digest of every password, in order. Unsalted backends hash every password once for all the stored
+    hashes of their format; salted ones have to hash every password again for every stored hash. batch_size is the
+    number of passwords given to hash_batch at once, between the checks of whether the search can stop.
+    """
+    name: str
+    parse: callable
+    hash_batch: callable
+    salted: bool = False
+    batch_size: int = BATCH_SIZE
+
+
+def _hex_parser(name, length):
+    def parse(stored):
+        if len(stored) == length and HEX_DIGEST.fullmatch(stored):
+            return ParsedHash(name, stored.lower())
+        return None
+    return parse
+
+
+def _unsalted_batch(algorithm):
+    def hash_batch(words, parsed=None):
+        return [hashlib.new(algorithm, word.encode()).hexdigest() for word in words]
+    return hash_batch
+
+
+def _salted_hex_parser(name, algorithm):
+    length = hashlib.new(algorithm).digest_size * 2
+
+    def parse(stored):
+        match = SALTED_HEX.fullmatch(stored)
+        if match is None or match.group(1) != algorithm or len(match.group(3)) != length:
+            return None
+        return ParsedHash(name, match.group(3).lower(), salt=match.group(2))
+    return parse
+
+
+def _salted_batch(algorithm):
+    def hash_batch(words, parsed):
+        return [hashlib.new(algorithm, (parsed.salt + word).encode()).hexdigest() for word in words]
+    return hash_batch
+
+
+def _parse_pbkdf2_sha256(stored):
+    match = PBKDF2_SHA256.fullmatch(stored)
+    if match is None:
+        return None
+    return ParsedHash('pbkdf2_sha256', match.group(3), salt=match.group(2), iterations=int(match.group(1)))
+
+
+def _pbkdf2_sha256_batch(words, parsed):
+    salt = parsed.salt.encode()
+    return [base64.b64encode(hashlib.pbkdf2_hmac('sha256', word.encode(), salt, parsed.iterations,
+                                                 PBKDF2_DIGEST_SIZE)).decode()
+            for word in words]
+
+
+# backend name -> HashBackend, in the order the formats are detected
+BACKENDS = {
+    'md5': HashBackend('md5', _hex_parser('md5', 32), _unsalted_batch('md5')),
+    'sha1': HashBackend('sha1', _hex_parser('sha1', 40), _unsalted_batch('sha1')),
+    'sha256': HashBackend('sha256', _hex_parser('sha256', 64), _unsalted_batch('sha256')),
+    'salted_md5': HashBackend('salted_md5', _salted_hex_parser('salted_md5', 'md5'), _salted_batch('md5'), True),
+    'salted_sha1': HashBackend('salted_sha1', _salted_hex_parser('salted_sha1', 'sha1'), _salted_batch('sha1'),
+                               True),
+    'salted_sha256': HashBackend('salted_sha256', _salted_hex_parser('salted_sha256', 'sha256'),
+                                 _salted_batch('sha256'), True),
+    'pbkdf2_sha256': HashBackend('pbkdf2_sha256', _parse_pbkdf2_sha256, _pbkdf2_sha256_batch, True,
+                                 PBKDF2_BATCH_SIZE),
+}
+
+
+def register_backend(backend):
+    """
+    Adds a hash format to the ones detected, or replaces the backend of a format with the same name.
+
+    Args:
+        backend (HashBackend): The backend of the format.
+    """
+    BACKENDS[backend.name] = backend
+
+
+def parse_hash(stored):
+    """
+    Detects the format of a stored password hash and splits it into its parts.
+
+    Args:
+        stored (str): The stored hash, e.g. an MD5 hex digest or 'sha1$<salt>$<hex digest>'.
+
+    Returns:
+        ParsedHash: The parsed hash, or None if it is not in any of the formats of BACKENDS.
+    """
+    if not isinstance(stored, str):
+        return None
+    for backend in BACKENDS.values():
+        parsed = backend.parse(stored)
+        if parsed is not None:
+            return parsed
+    return None
+
+
+def detect_format(stored):
+    """
+    Returns the name of the backend of a stored password hash, or None if its format is unknown.
+
+    Args:
+        stored (str): The stored hash.
+
+    Returns:
+        str: The name of the backend, one of BACKENDS.
+    """
+    parsed = parse_hash(stored)
+    return parsed.backend if parsed is not None else None
+
+
+def group_by_format(hashes):
+    """
+    Parses the given stored hashes and groups them by the backend of their format.
+
+    Args:
+        hashes (iterable): The stored hashes. Duplicates are only kept once; hashes in an unknown format are dropped.
+
+    Returns:
+        dict: A dictionary mapping every backend name to a dictionary of its stored hashes and their ParsedHash.
+    """
+    groups = {}
+    for stored in set(hashes):
+        parsed = parse_hash(stored)
+        if parsed is not None:
+            groups.setdefault(parsed.backend, {})[stored] = parsed
+    return groups
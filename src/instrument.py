@@ -0,0 +1,293 @@
+import atexit
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+
+MODES = ('table', 'jsonl')
+
+# PRACTICA_PROFILE=table prints a summary table on exit, PRACTICA_PROFILE=jsonl writes a JSON line per stage
+_mode = os.environ.get('PRACTICA_PROFILE', '')
+_mode = None if _mode in ('', '0') else _mode if _mode in MODES else 'table'
+_output = os.environ.get('PRACTICA_PROFILE_OUTPUT')
+_records = []
+_records_lock = threading.Lock()
+_local = threading.local()
+_concurrency = 0
+
+
+@dataclass
+class StageRecord:
+    """
+    The measurements of a run of an instrumented stage.
+
+    rows is the number of rows, entries or items the stage produced, when known. bytes_read counts the bytes
+    read by read system calls of the process during the stage; pages of memory-mapped files (the SQLite database
+    and the wordlist) are not included. peak_rss is the peak resident set size of the process during the stage
+    on Linux, or since the process started elsewhere. Both are measured for the whole process, so they are left
+    as None for the stages started inside a concurrent() block, which only the enclosing stage measures.
+    """
+    name: str
+    seconds: float = 0.0
+    rows: int = None
+    bytes_read: int = None
+    peak_rss: int = None
+    depth: int = 0
+    _child_peak: int = field(default=0, repr=False)
+
+
+_DISABLED_RECORD = StageRecord('disabled')
+
+
+def reset_peak_rss():
+    """
+    Resets the peak resident set size of the current process, where the platform allows it (Linux).
+
+    Returns:
+        bool: Whether the peak was reset. If not, peak_rss keeps reporting the peak since the process started.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of the current process, in bytes.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def _bytes_read():
+    try:
+        with open('/proc/self/io') as io:
+            for line in io:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def enable(mode='table', output=None):
+    """
+    Enables the instrumentation of the stages.
+
+    Only the functions decorated after this call are instrumented, so it must be called before the analysis modules
+    are imported. Setting the PRACTICA_PROFILE environment variable to 'table' or 'jsonl' does the same at startup.
+
+    Args:
+        mode (str, optional): 'table' to print a summary of every stage on exit, or 'jsonl' to write a JSON line
+            as each stage finishes. Defaults to 'table'.
+        output (str, optional): The file the summary or the JSON lines are appended to. Defaults to stderr, or the
+            PRACTICA_PROFILE_OUTPUT environment variable.
+
+    Raises:
+        ValueError: If the mode is not supported.
+    """
+    global _mode, _output
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode: {mode}.")
+    _mode = mode
+    _output = output or _output
+
+
+def is_enabled():
+    """
+    Returns whether the stages are being instrumented.
+    """
+    return _mode is not None
+
+
+def profiling():
+    """
+    Returns the mode and the output of the instrumentation, to enable it in the same way in another process.
+
+    Returns:
+        tuple: The mode, or None if the instrumentation is disabled, and the output file, or None for stderr.
+    """
+    return _mode, _output
+
+
+@contextmanager
+def concurrent():
+    """
+    Context manager for a block that runs stages concurrently in threads of the current process.
+
+    The bytes read and the peak memory of the process cannot be told apart between the stages running at the same
+    time, and resetting the peak for one of them would corrupt the others, so the stages started inside the block
+    only measure their time and rows. The stage enclosing the block measures it as a whole.
+    """
+    global _concurrency
+    with _records_lock:
+        _concurrency += 1
+    try:
+        yield
+    finally:
+        with _records_lock:
+            _concurrency -= 1
+
+
+def records():
+    """
+    Returns the records of the finished stages, in the order they finished.
+    """
+    with _records_lock:
+        return list(_records)
+
+
+def _write(text):
+    if _output:
+        with open(_output, 'a') as output:
+            output.write(text)
+    else:
+        sys.stderr.write(text)
+
+
+def _finish(record):
+    with _records_lock:
+        _records.append(record)
+    if _mode == 'jsonl':
+        values = {key: value for key, value in asdict(record).items() if not key.startswith('_')}
+        _write(json.dumps({'pid': os.getpid(), **values}) + '\n')
+
+
+@contextmanager
+def _measure(name):
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    if stack:
+        # the peak is about to be reset: keep what the enclosing stage reached so far
+        stack[-1]._child_peak = max(stack[-1]._child_peak, peak_rss())
+
+    record = StageRecord(name, depth=len(stack))
+    stack.append(record)
+    shared = _concurrency > 0
+    if not shared:
+        reset_peak_rss()
+    bytes_before = None if shared else _bytes_read()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - start
+        bytes_after = None if shared else _bytes_read()
+        if bytes_before is not None and bytes_after is not None:
+            record.bytes_read = bytes_after - bytes_before
+        if not shared:
+            record.peak_rss = max(peak_rss(), record._child_peak)
+        stack.pop()
+        if stack and record.peak_rss is not None:
+            stack[-1]._child_peak = max(stack[-1]._child_peak, record.peak_rss)
+        _finish(record)
+
+
+def stage(name):
+    """
+    Context manager that measures the enclosed block as a stage.
+
+    The yielded record accepts the number of rows processed (record.rows = n). When the instrumentation is disabled,
+    nothing is measured or recorded.
+
+    Args:
+        name (str): The name of the stage.
+
+    Yields:
+        StageRecord: The record of the stage, filled in on exit.
+    """
+    if _mode is None:
+        return nullcontext(_DISABLED_RECORD)
+    return _measure(name)
+
+
+def _count_rows(value):
+    # DataFrames, lists and dictionaries; the tuples returned by some helpers are not rows
+    if isinstance(value, (str, bytes, tuple)) or not hasattr(value, '__len__'):
+        return None
+    return len(value)
+
+
+def instrumented(name=None):
+    """
+    Decorator that measures every call of a function as a stage, counting the rows of its result.
+
+    When the instrumentation is disabled at decoration time, the function is returned unchanged, so it costs
+    nothing.
+
+    Args:
+        name (str, optional): The name of the stage. Defaults to the module and name of the function.
+
+    Returns:
+        function: The decorator.
+    """
+    def decorator(func):
+        if _mode is None:
+            return func
+        module = func.__module__
+        if module == '__main__':
+            # name the stages of a script like those of the module when imported
+            module = os.path.splitext(os.path.basename(getattr(sys.modules[module], '__file__', module)))[0]
+        stage_name = name or f'{module}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _measure(stage_name) as record:
+                result = func(*args, **kwargs)
+                record.rows = _count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def summary_table(stage_records=None):
+    """
+    Returns a table with the calls, total time, rows, bytes read and peak memory of every stage.
+
+    Args:
+        stage_records (list, optional): The records to summarize. Defaults to every finished stage.
+
+    Returns:
+        str: The table, one line per stage name in order of first appearance.
+    """
+    summary = {}
+    for record in records() if stage_records is None else stage_records:
+        calls, seconds, rows, bytes_read, peak = summary.get(record.name, (0, 0.0, None, None, None))
+        summary[record.name] = (calls + 1, seconds + record.seconds,
+                                rows if record.rows is None else (rows or 0) + record.rows,
+                                bytes_read if record.bytes_read is None else (bytes_read or 0) + record.bytes_read,
+                                peak if record.peak_rss is None else max(peak or 0, record.peak_rss))
+
+    width = max([len(name) for name in summary] + [len('stage')])
+    lines = [f"{'stage':<{width}} {'calls':>6} {'seconds':>10} {'rows':>10} {'MiB read':>9} {'peak MiB':>9}"]
+    for name, (calls, seconds, rows, bytes_read, peak) in summary.items():
+        rows = '-' if rows is None else rows
+        mib_read = '-' if bytes_read is None else f'{bytes_read / 2 ** 20:.1f}'
+        peak_mib = '-' if peak is None else f'{peak / 2 ** 20:.1f}'
+        lines.append(f"{name:<{width}} {calls:>6} {seconds:>10.4f} {rows:>10} {mib_read:>9} {peak_mib:>9}")
+    return '\n'.join(lines) + '\n'
+
+
+@atexit.register
+def _print_summary():
+    if _mode == 'table' and _records:
+        _write(summary_table())
@@ -0,0 +1,149 @@
+import ipaddress
+
+import pandas as pd
+
+import db
+from create_database import ip_to_int
+
+
+def int_to_ip(address):
+    """
+    Converts a 32-bit integer address back into its dotted-quad form.
+
+    Args:
+        address (int): The address as an unsigned 32-bit integer.
+
+    Returns:
+        str: The dotted-quad address.
+    """
+    return str(ipaddress.IPv4Address(int(address)))
+
+
+def get_ip_counts_per_user():
+    """
+    Fetches the number of distinct and total (counting repetitions) IPs of every user.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the 'user_id', 'distinct_ips' and 'total_ips' of every user with IPs.
+    """
+    with db.connect() as conn:
+        query = """
+            SELECT user_id, COUNT(*) AS distinct_ips, SUM(occurrences) AS total_ips
+            FROM ips
+            GROUP BY user_id
+        """
+        counts_df = pd.read_sql_query(query, conn)
+    return counts_df
+
+
+def get_user_ips(user_id):
+    """
+    Fetches the distinct IPs of a user.
+
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the dotted 'ip' and the 'occurrences' of every IP of the user.
+    """
+    with db.connect() as conn:
+        query = "SELECT address, occurrences FROM ips WHERE user_id = ? ORDER BY id"
+        ips_df = pd.read_sql_query(query, conn, params=(user_id,))
+    ips_df.insert(0, 'ip', ips_df.pop('address').map(int_to_ip))
+    return ips_df
+
+
+def get_shared_ips(min_users=2):
+    """
+    Fetches the IPs used by several users.
+
+    Args:
+        min_users (int, optional): The minimum number of distinct users of an IP. Defaults to 2.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the dotted 'ip', the number of 'users' and the total 'occurrences' of every
+        shared IP, from the most to the least shared.
+    """
+    with db.connect() as conn:
+        query = """
+            SELECT address, COUNT(*) AS users, SUM(occurrences) AS occurrences
+            FROM ips
+            GROUP BY address
+            HAVING COUNT(*) >= ?
+            ORDER BY users DESC, address
+        """
+        shared_df = pd.read_sql_query(query, conn, params=(min_users,))
+    shared_df.insert(0, 'ip', shared_df.pop('address').map(int_to_ip))
+    return shared_df
+
+
+def get_subnet_rollup(prefix_length=24):
+    """
+    Groups the IPs by subnet.
+
+    Args:
+        prefix_length (int, optional): The length of the network prefix, between 0 and 32. Defaults to 24.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the 'subnet' in CIDR notation and its number of distinct 'users',
+        distinct 'ips' and total 'occurrences', from the subnet with most users to the one with least.
+
+    Raises:
+        ValueError: If prefix_length is not between 0 and 32.
+    """
+    if not 0 <= prefix_length <= 32:
+        raise ValueError("The prefix_length parameter must be between 0 and 32.")
+    shift = 32 - prefix_length
+    with db.connect() as conn:
+        query = """
+            SELECT address >> ? AS network, COUNT(DISTINCT user_id) AS users, COUNT(DISTINCT address) AS ips,
+                   SUM(occurrences) AS occurrences
+            FROM ips
+            GROUP BY network
+            ORDER BY users DESC, network
+        """
+        subnets_df = pd.read_sql_query(query, conn, params=(shift,))
+    networks = subnets_df.pop('network')
+    subnets_df.insert(0, 'subnet', [f"{int_to_ip(network << shift)}/{prefix_length}" for network in networks])
+    return subnets_df
+
+
+def get_users_in_subnet(cidr):
+    """
+    Fetches the users that connected from a subnet, with a range scan over the address index.
+
+    Args:
+        cidr (str): The subnet in CIDR notation, e.g. '226.1.84.0/24'.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the 'user_id', the number of distinct 'ips' and the total 'occurrences'
+        of every user seen in the subnet.
+    """
+    network = ipaddress.IPv4Network(cidr, strict=False)
+    with db.connect() as conn:
+        query = """
+            SELECT user_id, COUNT(*) AS ips, SUM(occurrences) AS occurrences
+            FROM ips
+            WHERE address BETWEEN ? AND ?
+            GROUP BY user_id
+            ORDER BY user_id
+        """
+        users_df = pd.read_sql_query(query, conn, params=(int(network.network_address),
+                                                          int(network.broadcast_address)))
+    return users_df
+
+
+def find_ip(ip):
+    """
+    Fetches the users that connected from an IP.
+
+    Args:
+        ip (str): The dotted-quad address.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the 'user_id' and 'occurrences' of every user seen with the IP.
+    """
+    with db.connect() as conn:
+        query = "SELECT user_id, occurrences FROM ips WHERE address = ? ORDER BY user_id"
+        users_df = pd.read_sql_query(query, conn, params=(ip_to_int(ip),))
+    return users_df
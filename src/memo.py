@@ -0,0 +1,192 @@
+import functools
+import hashlib
+import os
+import pickle
+import threading
+import types
+from collections import OrderedDict
+
+import db
+from cracking import get_wordlist_path
+from create_database import get_data_version
+
+CACHE_DIRECTORY = 'cache'
+MEMORY_CACHE_SIZE = 32
+DISK_CACHE_MAX_BYTES = int(os.environ.get('PRACTICA_DISK_CACHE_MAX_BYTES', 256 << 20))
+
+_disk_cache_enabled = os.environ.get('PRACTICA_DISK_CACHE', '0') == '1'
+_disk_lock = threading.Lock()
+
+
+def _file_fingerprint(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def data_fingerprint():
+    """
+    Returns the path and the data version of the database, and the size and modification time of the wordlist.
+
+    Every write to the database changes its data version (see create_database.get_data_version), so any write or
+    change to the wordlist changes the fingerprint, which invalidates the cached results computed before. Reads
+    never change it.
+
+    Returns:
+        tuple: The path of the database, its data version or None if it has none, and the (size, mtime_ns) of the
+        wordlist or None if it is missing.
+    """
+    database_path = os.path.abspath(db.get_database_path())
+    version = None
+    if os.path.exists(database_path):
+        with db.connect(database_path) as conn:
+            version = get_data_version(conn)
+    return database_path, version, _file_fingerprint(get_wordlist_path())
+
+
+def set_disk_cache(enabled):
+    """
+    Enables or disables the on-disk tier of the memoized functions, off by default unless the PRACTICA_DISK_CACHE
+    environment variable is set to 1.
+
+    Args:
+        enabled (bool): Whether results are also stored in, and read from, the cache directory next to the database.
+    """
+    global _disk_cache_enabled
+    _disk_cache_enabled = enabled
+
+
+def cache_directory():
+    """
+    Returns the directory of the on-disk cache, next to the database.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(db.get_database_path())), CACHE_DIRECTORY)
+
+
+def _freeze(value):
+    """
+    Turns an argument into a hashable value. DataFrames and Series are represented by a hash of their content.
+    """
+    if hasattr(value, 'to_numpy') and hasattr(value, 'index'):
+        import pandas as pd
+        content = pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes()
+        columns = tuple(value.columns) if hasattr(value, 'columns') else value.name
+        return type(value).__name__, columns, hashlib.sha1(content).hexdigest()
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def _copy(value):
+    # callers must not be able to modify the cached object
+    return value.copy() if callable(getattr(value, 'copy', None)) else value
+
+
+def _disk_path(key):
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()
+    return os.path.join(cache_directory(), f'{digest}.pkl')
+
+
+def _disk_get(key):
+    try:
+        with open(_disk_path(key), 'rb') as cache_file:
+            stored_key, value = pickle.load(cache_file)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    return (value,) if stored_key == key else None
+
+
+def _disk_put(key, value):
+    directory = cache_directory()
+    os.makedirs(directory, exist_ok=True)
+    path = _disk_path(key)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as cache_file:
+        pickle.dump((key, value), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+    _evict_disk(directory)
+
+
+def _evict_disk(directory, max_bytes=None):
+    """
+    Removes the least recently written cache files until the directory holds at most max_bytes.
+    """
+    max_bytes = DISK_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _disk_lock:
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith('.pkl'):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def memoize(maxsize=MEMORY_CACHE_SIZE):
+    """
+    Decorator that caches the results of a function of the data in the database and the wordlist.
+
+    Results are keyed on the data fingerprint and the arguments, so they are reused until the database or the
+    wordlist change. They are kept in a per-function LRU of maxsize entries and, when the disk tier is enabled,
+    pickled in the cache directory, which is shared between processes and evicted by total size. Iterators are
+    never cached, and callers get a copy of the cached object.
+
+    Args:
+        maxsize (int, optional): The number of results kept in memory. Defaults to 32.
+
+    Returns:
+        function: The decorator.
+    """
+    def decorator(func):
+        memory = OrderedDict()
+        lock = threading.Lock()
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = name, data_fingerprint(), _freeze(args), _freeze(kwargs)
+            with lock:
+                if key in memory:
+                    memory.move_to_end(key)
+                    return _copy(memory[key])
+
+            cached = _disk_get(key) if _disk_cache_enabled else None
+            if cached is not None:
+                value = cached[0]
+            else:
+                value = func(*args, **kwargs)
+                if isinstance(value, (types.GeneratorType, map, filter, zip)):
+                    return value
+                if _disk_cache_enabled:
+                    _disk_put(key, value)
+
+            with lock:
+                memory[key] = value
+                memory.move_to_end(key)
+                while len(memory) > maxsize:
+                    memory.popitem(last=False)
+            return _copy(value)
+
+        def cache_clear():
+            with lock:
+                memory.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
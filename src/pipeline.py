@@ -0,0 +1,129 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from multiprocessing import get_context
+
+import db
+import instrument
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    A step of a pipeline.
+
+    The function of the stage is called with the results of its dependencies, in the order they are listed. Stages
+    run on a thread pool, which suits the SQLite queries and pandas operations that release the GIL, unless
+    in_process is set, in which case they run on a process pool and their function, arguments and result must be
+    picklable.
+    """
+    name: str
+    func: callable
+    dependencies: tuple = ()
+    in_process: bool = False
+
+
+def _init_process(database_path, wordlist_path, profile_mode=None, profile_output=None):
+    """
+    Initializes a spawned worker of the pipeline with the database, the wordlist and the profiling of the parent
+    process.
+    """
+    if profile_mode is not None:
+        instrument.enable(profile_mode, profile_output)
+    # imported once the profiling is enabled, so that its functions are instrumented
+    from cracking import set_wordlist_path
+
+    db.set_database_path(database_path)
+    set_wordlist_path(wordlist_path)
+
+
+def _check_graph(stages):
+    """
+    Returns the stages by name, checking that the names are unique, that every dependency exists and that there are
+    no cycles.
+    """
+    stages_by_name = {}
+    for stage in stages:
+        if stage.name in stages_by_name:
+            raise ValueError(f"Duplicated stage: {stage.name}.")
+        stages_by_name[stage.name] = stage
+    for stage in stages:
+        unknown = set(stage.dependencies) - set(stages_by_name)
+        if unknown:
+            raise ValueError(f"Unknown dependencies of {stage.name}: {', '.join(sorted(unknown))}.")
+
+    resolved = set()
+    remaining = dict(stages_by_name)
+    while remaining:
+        ready = [name for name, stage in remaining.items() if resolved.issuperset(stage.dependencies)]
+        if not ready:
+            raise ValueError(f"Cyclic dependencies between: {', '.join(sorted(remaining))}.")
+        for name in ready:
+            resolved.add(name)
+            del remaining[name]
+    return stages_by_name
+
+
+def run_pipeline(stages, workers=None, process_workers=None):
+    """
+    Runs the stages of a dependency graph, each one as soon as its dependencies have finished.
+
+    Independent stages run concurrently, so the pipeline takes about as long as its longest chain of stages. The
+    results of the stages are shared with their dependents without copying, except with those running in another
+    process, which must treat them as read-only. If a stage fails, no more stages are started and its exception
+    is raised once the running ones finish. When the stages are instrumented, those running in threads only measure
+    their time and rows, while those running in another process are measured by it.
+
+    Args:
+        stages (list): The Stage objects of the pipeline.
+        workers (int, optional): The number of threads. Defaults to one per stage.
+        process_workers (int, optional): The number of processes of the stages with in_process set. Defaults to one
+            per such stage. The pool is only started if there are any.
+
+    Returns:
+        dict: A dictionary mapping the name of every stage to its result.
+
+    Raises:
+        ValueError: If a stage is duplicated, depends on an unknown stage or the dependencies have a cycle.
+    """
+    pending = dict(_check_graph(stages))
+    if not pending:
+        return {}
+    num_process_stages = sum(stage.in_process for stage in pending.values())
+
+    results = {}
+    running = {}
+    processes = None
+    threads = ThreadPoolExecutor(max_workers=workers or len(pending), thread_name_prefix='pipeline')
+    # the stages share the process, which the instrumentation can only measure as a whole
+    with instrument.concurrent():
+        try:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if not all(dependency in results for dependency in stage.dependencies):
+                        continue
+                    arguments = [results[dependency] for dependency in stage.dependencies]
+                    if stage.in_process:
+                        if processes is None:
+                            from cracking import get_wordlist_path
+
+                            # spawned workers do not inherit the locks held by the threads, and get the database, the
+                            # wordlist and the profiling in use
+                            processes = ProcessPoolExecutor(max_workers=process_workers or num_process_stages,
+                                                            mp_context=get_context('spawn'),
+                                                            initializer=_init_process,
+                                                            initargs=(db.get_database_path(), get_wordlist_path(),
+                                                                      *instrument.profiling()))
+                        future = processes.submit(stage.func, *arguments)
+                    else:
+                        future = threads.submit(stage.func, *arguments)
+                    running[future] = name
+                    del pending[name]
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        finally:
+            threads.shutdown(wait=True, cancel_futures=True)
+            if processes is not None:
+                processes.shutdown(wait=True, cancel_futures=True)
+    return results
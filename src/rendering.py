@@ -0,0 +1,178 @@
+import os
+
+from instrument import instrumented
+
+FORMATS = ('png',)
+SUPPORTED_FORMATS = ('png', 'svg')
+DPI = 100
+
+
+def _draw_password_change_intervals(ax, admin_interval, normal_interval):
+    ax.bar(['Admin', 'Normal'], [admin_interval, normal_interval], color=['blue', 'orange'])
+    ax.set_xlabel('Tipo de usuario')
+    ax.set_ylabel('Intervalo medio de cambio de contraseña')
+    ax.set_title('Intervalo medio de cambio de contraseña para usuarios Admin y Normal')
+
+
+def _draw_outdated_policies(ax, sites, cookies, avisos, proteccion_de_datos):
+    bar_width = 0.3
+    r1 = list(range(len(sites)))
+    r2 = [x + bar_width for x in r1]
+    r3 = [x + bar_width for x in r2]
+
+    ax.barh(r1, cookies, color='red', height=bar_width, edgecolor='grey', label='Cookies desactualizados')
+    ax.barh(r2, avisos, color='green', height=bar_width, edgecolor='grey', label='Avisos desactualizados')
+    ax.barh(r3, proteccion_de_datos, color='blue', height=bar_width, edgecolor='grey',
+            label='Proteccion de Datos desactualizados')
+
+    ax.set_ylabel('Nombre del sitio web')
+    ax.set_xlabel('Número de políticas desactualizadas')
+    ax.set_title('Top 5 sitios web con más políticas desactualizadas')
+    ax.set_yticks(r2)
+    ax.set_yticklabels(sites)
+    ax.invert_yaxis()
+    ax.legend()
+
+
+def _draw_sites_by_year(ax, years, sites_counts):
+    ax.bar(years, sites_counts, color='b')
+    ax.set_xlabel('Year of Creation')
+    ax.set_ylabel('Number of Sites')
+    ax.set_title('Number of Sites by Year of Creation')
+
+
+# chart kind -> (figure size, function drawing the aggregates on an Axes)
+CHARTS = {
+    'password_change_intervals': ((8, 6), _draw_password_change_intervals),
+    'outdated_policies': ((10, 6), _draw_outdated_policies),
+    'sites_by_year': ((10, 6), _draw_sites_by_year),
+}
+
+
+def show_chart(kind, data):
+    """
+    Draws a chart in a pyplot window and blocks until it is closed.
+
+    Args:
+        kind (str): The kind of chart, one of CHARTS.
+        data (dict): The precomputed aggregates, passed as keyword arguments to the drawing function.
+    """
+    import matplotlib.pyplot as plt
+
+    figsize, draw = CHARTS[kind]
+    fig, ax = plt.subplots(figsize=figsize)
+    draw(ax, **data)
+    plt.show()
+
+
+def save_chart(kind, data, output_dir, formats=FORMATS, name=None):
+    """
+    Draws a chart without a display and writes it to the output directory.
+
+    The figure is built without pyplot and written by the Agg (PNG) or SVG canvas, so no window or display is
+    needed and nothing is kept in pyplot's global state.
+
+    Args:
+        kind (str): The kind of chart, one of CHARTS.
+        data (dict): The precomputed aggregates, passed as keyword arguments to the drawing function.
+        output_dir (str): The directory the files are written to.
+        formats (iterable, optional): The file formats to write, among 'png' and 'svg'. Defaults to ('png',).
+        name (str, optional): The name of the files, without extension. Defaults to kind.
+
+    Returns:
+        list: The paths of the written files.
+
+    Raises:
+        ValueError: If the kind of chart or a format is not supported.
+    """
+    if kind not in CHARTS:
+        raise ValueError(f"Unknown chart kind: {kind}.")
+    unsupported = set(formats) - set(SUPPORTED_FORMATS)
+    if unsupported:
+        raise ValueError(f"Unsupported formats: {', '.join(sorted(unsupported))}.")
+    from matplotlib.figure import Figure
+
+    figsize, draw = CHARTS[kind]
+    fig = Figure(figsize=figsize, dpi=DPI)
+    draw(fig.add_subplot(), **data)
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for file_format in formats:
+        path = os.path.join(output_dir, f'{name or kind}.{file_format}')
+        fig.savefig(path, format=file_format, bbox_inches='tight')
+        paths.append(path)
+    return paths
+
+
+def _save_chart(args):
+    return save_chart(*args)
+
+
+@instrumented()
+def render_charts(charts, output_dir, formats=FORMATS, workers=None):
+    """
+    Writes a batch of charts to the output directory, each one drawn in a worker process.
+
+    Args:
+        charts (list): A list of (kind, data) or (kind, data, name) tuples, as taken by save_chart.
+        output_dir (str): The directory the files are written to.
+        formats (iterable, optional): The file formats to write, among 'png' and 'svg'. Defaults to ('png',).
+        workers (int, optional): The number of worker processes. Defaults to one per chart, up to the number of
+            CPUs. With 1, or a single chart, the charts are drawn in the current process.
+
+    Returns:
+        dict: A dictionary mapping the name of every chart to the paths of its files.
+    """
+    formats = tuple(formats)
+    tasks = []
+    for chart in charts:
+        kind, data, name = chart if len(chart) == 3 else (*chart, None)
+        tasks.append((kind, data, output_dir, formats, name or kind))
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        results = [_save_chart(task) for task in tasks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+
+        # spawned, not forked: the charts may be rendered from a pipeline thread while other threads hold locks
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as executor:
+            results = list(executor.map(_save_chart, tasks))
+    return {task[4]: paths for task, paths in zip(tasks, results)}
+
+
+def outdated_policies_aggregates(worst_sites):
+    """
+    Returns the aggregates of the outdated policies chart.
+
+    Args:
+        worst_sites (list): A list of (site name, outdated policies) tuples, as returned by
+            ex4.get_most_outdated_sites.
+
+    Returns:
+        dict: The site names and, for every policy, whether each site has it outdated.
+    """
+    sites = [site for site, policies in worst_sites]
+    return {
+        'sites': sites,
+        'cookies': [int(policies['cookies']) for site, policies in worst_sites],
+        'avisos': [int(policies['aviso']) for site, policies in worst_sites],
+        'proteccion_de_datos': [int(policies['proteccion_de_datos']) for site, policies in worst_sites],
+    }
+
+
+def sites_by_year_aggregates(sites_by_year):
+    """
+    Returns the aggregates of the sites by creation year chart.
+
+    Args:
+        sites_by_year (dict): A dictionary where the keys are the creation years and the values are lists of sites
+            created in those years.
+
+    Returns:
+        dict: The sorted years and the number of sites created in each of them.
+    """
+    years = sorted(sites_by_year)
+    return {'years': years, 'sites_counts': [len(sites_by_year[year]) for year in years]}
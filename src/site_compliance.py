@@ -0,0 +1,140 @@
+import heapq
+from dataclasses import dataclass, field
+
+POLICIES = ('cookies', 'aviso', 'proteccion_de_datos')
+
+# number of outdated policies of every possible bitmask
+OUTDATED_COUNTS = tuple(bin(mask).count('1') for mask in range(1 << len(POLICIES)))
+
+
+@dataclass
+class SiteCompliance:
+    """
+    Columnar store of the legal compliance of the sites in legal_data_online.json.
+
+    Every site is kept at the same position in each column. The outdated policies of a site are packed in a bitmask
+    where bit i is set when POLICIES[i] is 0, and the sites are indexed by creation year when the store is built.
+    The original entries are never modified.
+    """
+    entries: list
+    names: list
+    outdated_masks: list
+    respects: list
+    years: list
+    year_index: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_data(cls, data):
+        """
+        Builds the store from the data loaded from legal_data_online.json.
+
+        Args:
+            data (dict): The data containing the site information, with the sites under the "legal" key.
+
+        Returns:
+            SiteCompliance: The store of the sites.
+        """
+        return cls.from_entries(data["legal"])
+
+    @classmethod
+    def from_entries(cls, entries):
+        """
+        Builds the store from a list of single-key site dictionaries.
+
+        Args:
+            entries (list): A list of dictionaries mapping a site name to its information.
+
+        Returns:
+            SiteCompliance: The store of the sites.
+        """
+        store = cls(entries=list(entries), names=[], outdated_masks=[], respects=[], years=[])
+        for index, entry in enumerate(store.entries):
+            for site, info in entry.items():
+                mask = 0
+                for bit, policy in enumerate(POLICIES):
+                    if info[policy] == 0:
+                        mask |= 1 << bit
+                store.names.append(site)
+                store.outdated_masks.append(mask)
+                store.respects.append(all(info[policy] == 1 for policy in POLICIES))
+                store.years.append(info['creacion'])
+                store.year_index.setdefault(info['creacion'], []).append(index)
+        return store
+
+    def outdated_count(self, index):
+        """
+        Returns the number of outdated policies of the site at a position of the store.
+        """
+        return OUTDATED_COUNTS[self.outdated_masks[index]]
+
+    def outdated_policies(self, index):
+        """
+        Returns whether each policy of the site at a position of the store is outdated, in POLICIES order.
+        """
+        mask = self.outdated_masks[index]
+        return {policy: bool(mask >> bit & 1) for bit, policy in enumerate(POLICIES)}
+
+    def worst_sites(self, num_sites=5):
+        """
+        Returns the entries of the sites with the most outdated policies.
+
+        Only the num_sites worst sites are selected with a heap. They are returned from the least to the most
+        outdated, ties keeping the order of the data.
+
+        Args:
+            num_sites (int, optional): The number of sites to return. Defaults to 5.
+
+        Returns:
+            list: The single-key dictionaries of the worst sites.
+        """
+        worst = heapq.nlargest(num_sites, range(len(self.entries)), key=lambda i: (self.outdated_count(i), i))
+        return [self.entries[i] for i in reversed(worst)]
+
+    def most_outdated(self, num_sites=5):
+        """
+        Returns the sites with the most outdated policies, from the most to the least outdated.
+
+        Ties keep the order of the data.
+
+        Args:
+            num_sites (int, optional): The number of sites to return. Defaults to 5.
+
+        Returns:
+            list: A list of (site name, outdated policies) tuples, as in outdated_policies.
+        """
+        worst = heapq.nsmallest(num_sites, range(len(self.entries)), key=lambda i: (-self.outdated_count(i), i))
+        return [(self.names[i], self.outdated_policies(i)) for i in worst]
+
+    def split_by_respect(self):
+        """
+        Splits the sites into those with every policy up to date and the rest.
+
+        Returns:
+            tuple: The positions of the respecting sites and the positions of the non-respecting sites.
+        """
+        respecting = [i for i, respects in enumerate(self.respects) if respects]
+        non_respecting = [i for i, respects in enumerate(self.respects) if not respects]
+        return respecting, non_respecting
+
+    def group_by_year(self, positions=None):
+        """
+        Groups the names of the sites by creation year using the year index.
+
+        Args:
+            positions (iterable, optional): The positions of the sites to group. Defaults to every site.
+
+        Returns:
+            dict: A dictionary where the keys are the creation years, in ascending order, and the values are lists
+            of the names of the sites created in those years.
+        """
+        if positions is None:
+            return {year: [self.names[i] for i in self.year_index[year]]
+                    for year in sorted(self.year_index, key=int)}
+
+        selected = set(positions)
+        sites_by_year = {}
+        for year in sorted(self.year_index, key=int):
+            sites = [self.names[i] for i in self.year_index[year] if i in selected]
+            if sites:
+                sites_by_year[year] = sites
+        return sites_by_year
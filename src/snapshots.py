@@ -0,0 +1,213 @@
+import argparse
+import importlib.util
+import os
+
+import db
+from create_database import create_tables, get_data_version
+
+SNAPSHOT_DIRECTORY = 'snapshots'
+EXPORT_CHUNK_SIZE = 100000
+# key of the Parquet metadata holding the version of the data a snapshot was exported from
+VERSION_KEY = b'data_version'
+
+# pandas dtypes of the snapshot columns; nullable types keep NULLs without turning integers into floats
+SNAPSHOT_DTYPES = {
+    'users': {
+        'id': 'int64',
+        'username': 'string',
+        'phone': 'string',
+        'password_hash': 'string',
+        'province': 'string',
+        'permissions': 'Int64',
+        'total_emails': 'Int64',
+        'phishing_emails': 'Int64',
+        'clicked_emails': 'Int64',
+        'weak_password': 'Int64',
+        'content_hash': 'string',
+    },
+    'dates': {
+        'id': 'int64',
+        'user_id': 'Int64',
+        'date': 'string',
+        'day': 'Int64',
+    },
+    'ips': {
+        'id': 'int64',
+        'user_id': 'Int64',
+        'address': 'Int64',
+        'occurrences': 'Int64',
+    },
+}
+
+
+def parquet_available():
+    """
+    Returns whether pyarrow, needed to read and write the Parquet snapshots, is installed.
+    """
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def snapshot_path(table, database_path=None):
+    """
+    Returns the path of the Parquet snapshot of a table, in the snapshots directory next to the database.
+
+    Args:
+        table (str): The name of the table.
+        database_path (str, optional): The path to the SQLite database. Defaults to db.get_database_path().
+
+    Returns:
+        str: The path of the snapshot.
+    """
+    directory = os.path.dirname(os.path.abspath(database_path or db.get_database_path()))
+    return os.path.join(directory, SNAPSHOT_DIRECTORY, f'{table}.parquet')
+
+
+def snapshot_version(table, database_path=None):
+    """
+    Returns the version of the data a snapshot was exported from, stored in the metadata of the Parquet file.
+
+    Args:
+        table (str): The name of the table.
+        database_path (str, optional): The path to the SQLite database. Defaults to db.get_database_path().
+
+    Returns:
+        str: The data version, or None if there is no readable snapshot.
+    """
+    import pyarrow.parquet as pq
+    try:
+        metadata = pq.read_schema(snapshot_path(table, database_path)).metadata or {}
+    except (OSError, ValueError):
+        return None
+    version = metadata.get(VERSION_KEY)
+    return version.decode() if version is not None else None
+
+
+def is_snapshot_fresh(table, database_path=None):
+    """
+    Returns whether the snapshot of a table exists and was exported from the current version of the data.
+
+    The version is the one of create_database.get_data_version, which every write to the tables changes, so reads
+    never make a snapshot stale.
+
+    Args:
+        table (str): The name of the table.
+        database_path (str, optional): The path to the SQLite database. Defaults to db.get_database_path().
+
+    Returns:
+        bool: True if the snapshot can be read instead of the table.
+    """
+    database_path = database_path or db.get_database_path()
+    if not os.path.exists(snapshot_path(table, database_path)) or not os.path.exists(database_path):
+        return False
+    with db.connect(database_path) as conn:
+        version = get_data_version(conn)
+    return version is not None and snapshot_version(table, database_path) == version
+
+
+def export_snapshots(tables=None, database_path=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Writes typed Parquet snapshots of the users, dates and ips tables.
+
+    Every table is read in chunks of chunk_size rows that are written as row groups, so tables larger than memory
+    can be exported. Each table is read in a single transaction, so its snapshot is consistent with the data
+    version recorded in it. Each snapshot is written to a temporary file and then moved into place.
+
+    Args:
+        tables (iterable, optional): The tables to export. Defaults to every table in SNAPSHOT_DTYPES.
+        database_path (str, optional): The path to the SQLite database. Defaults to db.get_database_path().
+        chunk_size (int, optional): The number of rows read and written at a time. Defaults to 100000.
+
+    Returns:
+        dict: A dictionary mapping every exported table to its number of rows.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    if not parquet_available():
+        raise ImportError("Exporting snapshots requires pyarrow (pip install pyarrow).")
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    database_path = database_path or db.get_database_path()
+    with db.connect(database_path) as conn:
+        create_tables(conn)
+
+    exported = {}
+    for table in tables or SNAPSHOT_DTYPES:
+        dtypes = SNAPSHOT_DTYPES[table]
+        path = snapshot_path(table, database_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+
+        writer = None
+        rows = 0
+        with db.connect(database_path) as conn:
+            conn.execute('BEGIN')
+            metadata = {VERSION_KEY: get_data_version(conn).encode()}
+            query = f"SELECT {', '.join(dtypes)} FROM {table} ORDER BY id"
+            for chunk in pd.read_sql_query(query, conn, chunksize=chunk_size):
+                arrow_table = pa.Table.from_pandas(chunk.astype(dtypes), preserve_index=False)
+                arrow_table = arrow_table.replace_schema_metadata({**arrow_table.schema.metadata, **metadata})
+                if writer is None:
+                    writer = pq.ParquetWriter(temporary_path, arrow_table.schema)
+                writer.write_table(arrow_table)
+                rows += len(chunk)
+            conn.rollback()
+        if writer is None:
+            empty = pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+            empty_table = pa.Table.from_pandas(empty, preserve_index=False)
+            pq.write_table(empty_table.replace_schema_metadata({**empty_table.schema.metadata, **metadata}),
+                           temporary_path)
+        else:
+            writer.close()
+        os.replace(temporary_path, path)
+        exported[table] = rows
+    return exported
+
+
+def load_table(table, columns=None, filters=None):
+    """
+    Loads a table, preferring its Parquet snapshot when it was exported from the current version of the data.
+
+    Only the requested columns are read from the snapshot. Without pyarrow or a fresh snapshot, the same columns
+    and rows are queried from the database.
+
+    Args:
+        table (str): The name of the table.
+        columns (list, optional): The columns to load. Defaults to every column.
+        filters (list, optional): A list of (column, value) equality conditions the rows must meet.
+
+    Returns:
+        pandas.DataFrame: The loaded rows, in id order.
+    """
+    import pandas as pd
+    filters = filters or []
+    if parquet_available() and table in SNAPSHOT_DTYPES and is_snapshot_fresh(table):
+        parquet_filters = [(column, '==', value) for column, value in filters] or None
+        return pd.read_parquet(snapshot_path(table), columns=columns, filters=parquet_filters)
+
+    query = f"SELECT {', '.join(columns) if columns else '*'} FROM {table}"
+    if filters:
+        query += ' WHERE ' + ' AND '.join(f'{column} = ?' for column, value in filters)
+    query += ' ORDER BY id'
+    with db.connect() as conn:
+        table_df = pd.read_sql_query(query, conn, params=[value for column, value in filters])
+    return table_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exports Parquet snapshots of the users, dates and ips tables.')
+    parser.add_argument('tables', nargs='*', help=f"tables to export, among {', '.join(SNAPSHOT_DTYPES)}")
+    parser.add_argument('--db', default=db.DATABASE_PATH, help='path to the SQLite database')
+    args = parser.parse_args()
+    unknown = set(args.tables) - set(SNAPSHOT_DTYPES)
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+
+    for table, rows in export_snapshots(args.tables or None, args.db).items():
+        print(f"Exported {rows} rows of {table} to {snapshot_path(table, args.db)}")
+
+
+if __name__ == "__main__":
+    main()
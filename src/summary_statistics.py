@@ -0,0 +1,91 @@
+import math
+from dataclasses import dataclass
+
+import db
+
+
+@dataclass
+class SummaryStatistics:
+    """
+    The metrics reported by ex2.py.
+
+    Standard deviations are sample standard deviations, like pandas' std, and are NaN when there are fewer than
+    two values.
+    """
+    num_samples: int
+    avg_dates_modified: float
+    std_dates_modified: float
+    avg_total_ips: float
+    std_total_ips: float
+    avg_distinct_ips: float
+    std_distinct_ips: float
+    avg_phishing_emails: float
+    std_phishing_emails: float
+    min_total_emails: int
+    max_total_emails: int
+    min_phishing_admin: int
+    max_phishing_admin: int
+
+
+def _mean_and_std(count, total, total_squares):
+    """
+    Returns the mean and the sample standard deviation from the count, sum and sum of squares of some values.
+    """
+    if not count:
+        return math.nan, math.nan
+    mean = total / count
+    if count < 2:
+        return mean, math.nan
+    variance = (total_squares - total * total / count) / (count - 1)
+    return mean, math.sqrt(max(variance, 0.0))
+
+
+def _per_user_count_moments(conn, table, count_expression):
+    """
+    Returns the mean and sample standard deviation of a per-user count of a table (e.g. 'COUNT(date)'),
+    in a single scan of the table.
+    """
+    count, total, total_squares = conn.execute(f'''
+        SELECT COUNT(*), SUM(n), SUM(n * n)
+        FROM (SELECT {count_expression} AS n FROM {table} GROUP BY user_id)
+    ''').fetchone()
+    return _mean_and_std(count, total, total_squares)
+
+
+def compute_summary_statistics(database_path=None):
+    """
+    Computes every metric of ex2.py with SQL aggregates.
+
+    Each table is scanned once and only the aggregates are brought into Python, so the memory used does not depend
+    on the size of the database.
+
+    Args:
+        database_path (str, optional): The path to the SQLite database. Defaults to db.get_database_path().
+
+    Returns:
+        SummaryStatistics: The computed metrics.
+    """
+    with db.connect(database_path) as conn:
+        (num_samples, phishing_count, phishing_total, phishing_squares, min_total_emails, max_total_emails,
+         min_phishing_admin, max_phishing_admin) = conn.execute('''
+            SELECT COUNT(*),
+                   COUNT(phishing_emails),
+                   SUM(phishing_emails),
+                   SUM(phishing_emails * phishing_emails),
+                   MIN(total_emails),
+                   MAX(total_emails),
+                   MIN(CASE WHEN permissions = 1 THEN phishing_emails END),
+                   MAX(CASE WHEN permissions = 1 THEN phishing_emails END)
+            FROM users
+        ''').fetchone()
+
+        avg_dates_modified, std_dates_modified = _per_user_count_moments(conn, 'dates', 'COUNT(date)')
+        # the IPs of a user are stored once with their number of occurrences
+        avg_total_ips, std_total_ips = _per_user_count_moments(conn, 'ips', 'SUM(occurrences)')
+        avg_distinct_ips, std_distinct_ips = _per_user_count_moments(conn, 'ips', 'COUNT(*)')
+
+    avg_phishing_emails, std_phishing_emails = _mean_and_std(phishing_count, phishing_total, phishing_squares)
+
+    return SummaryStatistics(num_samples, avg_dates_modified, std_dates_modified, avg_total_ips, std_total_ips,
+                             avg_distinct_ips, std_distinct_ips, avg_phishing_emails, std_phishing_emails,
+                             min_total_emails, max_total_emails, min_phishing_admin, max_phishing_admin)
@@ -0,0 +1,209 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import random
+import string
+
+# size of the shipped datasets, multiplied by the scale of the generated ones
+BASE_USERS = 30
+BASE_SITES = 20
+WORDLIST_WORDS_PER_SCALE = 1000
+HIT_RATE = 0.2
+
+USERS_FILE = 'users_data_online.json'
+LEGAL_FILE = 'legal_data_online.json'
+WORDLIST_FILE = 'rockyou.txt'
+
+FIRST_NAMES = ('luis', 'juan', 'jose', 'julio', 'antonio', 'juana', 'ines', 'alicia', 'jesus', 'raul', 'javier',
+               'eduardo', 'enrique', 'leo', 'ivan', 'clara', 'virginia', 'fran', 'maria', 'lucia')
+LAST_NAMES = ('garcia', 'munoz', 'suarez', 'martinez', 'lozano', 'diaz', 'lopez', 'vazquez', 'duarte', 'perez',
+              'osorio', 'galan', 'sanz', 'moran', 'fernandez', 'marin', 'cruz', 'moreno', 'ruiz', 'gomez')
+PROVINCES = ('Alava', 'Albacete', 'Alicante', 'Almeria', 'Asturias', 'Avila', 'Badajoz', 'Barcelona', 'Burgos',
+             'Caceres', 'Cuenca', 'Guadalajara', 'Guipuzcoa', 'Huelva', 'Huesca', 'Islas Baleares', 'Jaen',
+             'La Coruna', 'La Rioja', 'Lerida', 'Lugo', 'Madrid', 'Sevilla', 'Valencia')
+
+# shape of the shipped users: 1 to 20 password changes and as many IPs, some of them repeated, a third of the
+# phones and provinces missing and one user in 30 without IPs
+MIN_CHANGES = 1
+MAX_CHANGES = 20
+REPEATED_IP_RATE = 0.15
+SHARED_IP_RATE = 0.05
+MISSING_RATE = 1 / 3
+NO_IPS_RATE = 1 / 30
+ADMIN_RATE = 0.45
+MAX_TOTAL_EMAILS = 500
+FIRST_DAY = datetime.date(2018, 1, 1).toordinal()
+LAST_DAY = datetime.date(2023, 12, 31).toordinal()
+FIRST_CREATION_YEAR = 1995
+LAST_CREATION_YEAR = 2023
+
+WORD_ALPHABET = string.ascii_lowercase + string.digits
+# never used in the wordlist, so passwords containing them cannot be cracked
+MISS_ALPHABET = string.ascii_uppercase + '!#$%&*'
+
+
+def _random_ip(rng):
+    return '.'.join(str(rng.randrange(256)) for _ in range(4))
+
+
+def _random_date(rng):
+    day = datetime.date.fromordinal(rng.randint(FIRST_DAY, LAST_DAY))
+    return f'{day.day}/{day.month}/{day.year}'
+
+
+def _random_word(rng):
+    return ''.join(rng.choices(WORD_ALPHABET, k=rng.randint(6, 12)))
+
+
+def write_wordlist(path, num_words, wanted, rng):
+    """
+    Writes a wordlist of random lowercase words, one per line.
+
+    Args:
+        path (str): The path of the wordlist.
+        num_words (int): The number of words.
+        wanted (set): The positions of the words to return.
+        rng (random.Random): The seeded random generator.
+
+    Returns:
+        dict: A dictionary mapping every wanted position to its word.
+    """
+    found = {}
+    with open(path, 'w', encoding='latin-1') as wordlist:
+        for index in range(num_words):
+            word = _random_word(rng)
+            if index in wanted:
+                found[index] = word
+            wordlist.write(word + '\n')
+    return found
+
+
+def _write_array(path, key, entries):
+    # the same layout as the shipped files: a single top-level key holding an array of single-key objects
+    count = 0
+    with open(path, 'w', encoding='utf-8') as json_file:
+        json_file.write(f'{{\n\t"{key}": [')
+        for entry in entries:
+            if count:
+                json_file.write(', ')
+            json_file.write(json.dumps(entry, ensure_ascii=False))
+            count += 1
+        json_file.write(']\n}\n')
+    return count
+
+
+def _iter_users(num_users, passwords, rng):
+    shared_ips = [_random_ip(rng) for _ in range(max(1, num_users // 10))]
+    for index in range(num_users):
+        username = f'{rng.choice(FIRST_NAMES)}.{rng.choice(LAST_NAMES)}{index}'
+        changes = rng.randint(MIN_CHANGES, MAX_CHANGES)
+
+        if rng.random() < NO_IPS_RATE:
+            ips = "None"
+        else:
+            ips = []
+            for _ in range(changes):
+                if ips and rng.random() < REPEATED_IP_RATE:
+                    ips.append(rng.choice(ips))
+                elif rng.random() < SHARED_IP_RATE:
+                    ips.append(rng.choice(shared_ips))
+                else:
+                    ips.append(_random_ip(rng))
+
+        total = rng.randint(0, MAX_TOTAL_EMAILS)
+        phishing = rng.randint(0, total)
+        yield {username: {
+            'telefono': "None" if rng.random() < MISSING_RATE else rng.randint(60000000, 79999999),
+            'contrasena': hashlib.md5(passwords[index].encode('latin-1')).hexdigest(),
+            'provincia': "None" if rng.random() < MISSING_RATE else rng.choice(PROVINCES),
+            'permisos': '1' if rng.random() < ADMIN_RATE else '0',
+            'emails': {'total': total, 'phishing': phishing, 'cliclados': rng.randint(0, phishing)},
+            'fechas': [_random_date(rng) for _ in range(changes)],
+            'ips': ips,
+        }}
+
+
+def _iter_sites(num_sites, rng):
+    for index in range(num_sites):
+        name = f"www.{''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))}{index}.com"
+        yield {name: {
+            'cookies': rng.randint(0, 1),
+            'aviso': rng.randint(0, 1),
+            'proteccion_de_datos': rng.randint(0, 1),
+            'creacion': rng.randint(FIRST_CREATION_YEAR, LAST_CREATION_YEAR),
+        }}
+
+
+def generate_dataset(output_dir, scale=10, seed=0, hit_rate=HIT_RATE, wordlist_size=None):
+    """
+    Writes synthetic users and legal JSON files with the schema of the shipped ones, and a matching wordlist.
+
+    The same seed always produces the same files. A hit_rate fraction of the users have a password taken from the
+    wordlist; the passwords of the rest contain characters the wordlist never uses, so they are never cracked.
+
+    Args:
+        output_dir (str): The directory the users_data_online.json, legal_data_online.json and rockyou.txt files
+            are written to.
+        scale (int, optional): The size of the dataset relative to the shipped one (30 users and 20 sites).
+            Defaults to 10.
+        seed (int, optional): The seed of the random generator. Defaults to 0.
+        hit_rate (float, optional): The fraction of users with a password in the wordlist. Defaults to 0.2.
+        wordlist_size (int, optional): The number of words of the wordlist. Defaults to 1000 per unit of scale.
+
+    Returns:
+        dict: The paths of the 'users', 'legal' and 'wordlist' files and the number of 'num_users', 'num_sites',
+        'num_words' and 'num_hits' generated.
+
+    Raises:
+        ValueError: If the scale is not positive or the hit rate is not between 0 and 1.
+    """
+    if scale <= 0:
+        raise ValueError("The scale parameter must be positive.")
+    if not 0 <= hit_rate <= 1:
+        raise ValueError("The hit_rate parameter must be between 0 and 1.")
+
+    rng = random.Random(seed)
+    num_users = round(BASE_USERS * scale)
+    num_sites = round(BASE_SITES * scale)
+    num_words = wordlist_size if wordlist_size is not None else round(WORDLIST_WORDS_PER_SCALE * scale)
+    num_hits = round(num_users * hit_rate) if num_words else 0
+    os.makedirs(output_dir, exist_ok=True)
+
+    hit_users = rng.sample(range(num_users), num_hits)
+    hit_words = [rng.randrange(num_words) for _ in hit_users]
+    wordlist_path = os.path.join(output_dir, WORDLIST_FILE)
+    words = write_wordlist(wordlist_path, num_words, set(hit_words), rng)
+
+    passwords = [''.join(rng.choices(MISS_ALPHABET + WORD_ALPHABET, k=9)) + rng.choice(MISS_ALPHABET)
+                 for _ in range(num_users)]
+    for user, word in zip(hit_users, hit_words):
+        passwords[user] = words[word]
+
+    users_path = os.path.join(output_dir, USERS_FILE)
+    legal_path = os.path.join(output_dir, LEGAL_FILE)
+    _write_array(users_path, 'usuarios', _iter_users(num_users, passwords, rng))
+    _write_array(legal_path, 'legal', _iter_sites(num_sites, rng))
+
+    return {'users': users_path, 'legal': legal_path, 'wordlist': wordlist_path, 'num_users': num_users,
+            'num_sites': num_sites, 'num_words': num_words, 'num_hits': num_hits}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generates a synthetic dataset with the schema of the shipped one.')
+    parser.add_argument('output_dir', help='directory the JSON files and the wordlist are written to')
+    parser.add_argument('--scale', type=float, default=10, help='size relative to the shipped dataset (default: 10)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random generator (default: 0)')
+    parser.add_argument('--hit-rate', type=float, default=HIT_RATE,
+                        help=f'fraction of passwords found in the wordlist (default: {HIT_RATE})')
+    parser.add_argument('--wordlist-size', type=int, help='number of words of the wordlist (default: 1000 per scale)')
+    args = parser.parse_args()
+
+    dataset = generate_dataset(args.output_dir, args.scale, args.seed, args.hit_rate, args.wordlist_size)
+    print(f"Generated {dataset['num_users']} users, {dataset['num_sites']} sites and a wordlist of "
+          f"{dataset['num_words']} words with {dataset['num_hits']} hits in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
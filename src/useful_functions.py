@@ -1,54 +1,120 @@
-import pandas as pd
-import sqlite3
-import hashlib
 import os
+import db
+from instrument import instrumented
+from memo import memoize
+from cracking import crack_password_hashes, get_wordlist_path, lookup_table_path, wordlist_fingerprint
+from create_database import (LEGAL_JSON_PATH, bump_data_version, create_tables, ensure_sites_loaded,
+                             ensure_weak_password_column)
+from snapshots import load_table
 
+@instrumented()
+@memoize()
+def get_cracked_passwords():
+    """
+    Cracks the password hashes of the users against the rockyou.txt dictionary.
+
+    The format of every hash is detected. MD5 hashes are looked up in the precomputed table stored next to the
+    database, which is built on the first call and rebuilt whenever rockyou.txt changes; SHA-1, SHA-256 and salted
+    hashes are checked by hashing the dictionary with their algorithm.
+
+    Returns:
+        dict: A dictionary mapping every cracked password hash to its plaintext, in dictionary order.
+    """
+    with db.connect() as conn:
+        cursor = conn.execute('SELECT DISTINCT password_hash FROM users')
+        hashed_passwords = [password_hash[0] for password_hash in cursor.fetchall()]
+
+    wordlist_path = get_wordlist_path()
+    return crack_password_hashes(hashed_passwords, wordlist_path,
+                                 lookup_table_path(db.get_database_path(), wordlist_path))
+
+@instrumented()
 def get_weak_passwords():
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
+    """
+    Returns the password hashes of the users that appear in the rockyou.txt dictionary.
+
+    Returns:
+        list: The weak password hashes, in dictionary order.
+    """
+    return list(get_cracked_passwords())
+
+@instrumented()
+def classify_passwords(wordlist_path=None):
+    """
+    Stores in the weak_password column of the users table whether each password appears in the wordlist.
+
+    Only the users that have not been classified yet are checked, unless the wordlist is a different one or changed
+    since the last classification, in which case every user is checked again.
 
-    cursor.execute('SELECT DISTINCT password_hash FROM users')
-    password_hashes = cursor.fetchall()
-    hashed_passwords = [password_hash[0] for password_hash in password_hashes]
-    weak_passwords = []
+    Args:
+        wordlist_path (str, optional): The path to the wordlist. Defaults to cracking.get_wordlist_path().
+    """
+    wordlist_path = wordlist_path or get_wordlist_path()
+    with db.connect() as conn:
+        ensure_weak_password_column(conn)
 
-    with open("rockyou.txt", "r", encoding="latin-1") as dic_file:
-        for mot in dic_file:
-            mot = mot.strip()
-            hachage_md5 = hashlib.md5(mot.encode()).hexdigest()
-            if hachage_md5 in hashed_passwords and not hachage_md5 in weak_passwords:
-                weak_passwords.append(hachage_md5)
+        size, mtime_ns = wordlist_fingerprint(wordlist_path)
+        wordlist_version = f"{os.path.abspath(wordlist_path)}:{size}:{mtime_ns}"
+        stored_version = conn.execute("SELECT value FROM metadata WHERE key = 'weak_password_wordlist'").fetchone()
+        if stored_version is None or stored_version[0] != wordlist_version:
+            with conn:
+                conn.execute('UPDATE users SET weak_password = NULL')
+                bump_data_version(conn)
 
-    conn.close()
-    return weak_passwords
+        cursor = conn.execute('SELECT DISTINCT password_hash FROM users WHERE weak_password IS NULL')
+        unclassified = [password_hash[0] for password_hash in cursor.fetchall()]
+        if not unclassified and stored_version is not None and stored_version[0] == wordlist_version:
+            return
+        cracked = crack_password_hashes(unclassified, wordlist_path,
+                                        lookup_table_path(db.get_database_path(), wordlist_path))
 
+        with conn:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS cracked (password_hash TEXT PRIMARY KEY)')
+            conn.execute('DELETE FROM temp.cracked')
+            conn.executemany('INSERT OR IGNORE INTO temp.cracked (password_hash) VALUES (?)', [(h,) for h in cracked])
+            conn.execute('''
+                UPDATE users SET weak_password = COALESCE(password_hash IN (SELECT password_hash FROM temp.cracked), 0)
+                WHERE weak_password IS NULL
+            ''')
+            conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('weak_password_wordlist', ?)",
+                         (wordlist_version,))
+            bump_data_version(conn)
+
+def prepare_database(classify=True, wordlist_path=None, legal_json_path=LEGAL_JSON_PATH):
+    """
+    Brings the database up to date for the analysis functions, which only read it.
+
+    The tables are created or migrated, the sites are loaded if their table is empty and, unless classify is False,
+    the passwords are classified. The scripts call it before their analysis, so the getters never write.
+
+    Args:
+        classify (bool, optional): Whether to classify the passwords, which needs the wordlist. Defaults to True.
+        wordlist_path (str, optional): The path to the wordlist. Defaults to cracking.get_wordlist_path().
+        legal_json_path (str, optional): The path to the legal JSON file the sites are loaded from. Defaults to
+            create_database.LEGAL_JSON_PATH.
+    """
+    with db.connect() as conn:
+        create_tables(conn)
+        ensure_sites_loaded(conn, legal_json_path)
+    if classify:
+        classify_passwords(wordlist_path)
+
+@instrumented()
+@memoize()
 def get_users_with_weak_passwords():
-    conn = sqlite3.connect('database.db')
-    weak_passwords = get_weak_passwords()
-    weak_passwords_str = ','.join(['"{}"'.format(mdp) for mdp in weak_passwords])
-    query = f"SELECT * FROM users WHERE password_hash IN ({weak_passwords_str})"
-    users_df = pd.read_sql_query(query, conn)
-    conn.close()
+    users_df = load_table('users', filters=[('weak_password', 1)])
     return users_df
 
+@instrumented()
+@memoize()
 def get_users_with_strong_passwords():
-    conn = sqlite3.connect('database.db')
-    weak_passwords = get_weak_passwords()
-    weak_passwords_str = ','.join(['"{}"'.format(mdp) for mdp in weak_passwords])
-
-    query = f"SELECT * FROM users WHERE password_hash NOT IN ({weak_passwords_str})"
-    users_df = pd.read_sql_query(query, conn)
-    
-    conn.close()
+    users_df = load_table('users', filters=[('weak_password', 0)])
     return users_df
 
-
-
+@instrumented()
+@memoize()
 def get_users_by_permission_type(permission_type: int):
     if permission_type not in [0, 1]:
         raise ValueError("The permission_type parameter must be either 0 or 1.")
-    conn = sqlite3.connect('database.db')
-    query = "SELECT * FROM users WHERE permissions=?"
-    users_df = pd.read_sql_query(query, conn, params=(permission_type,))
-    conn.close()
+    users_df = load_table('users', filters=[('permissions', permission_type)])
     return users_df